@@ -10,8 +10,23 @@ import asyncio
 import requests_async as requests
 import datetime
 
-loop = asyncio.new_event_loop()
-asyncio.get_child_watcher().attach_loop(loop)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+def new_event_loop():
+    """
+    Loop factory for the update thread and the dev server, uvloop when it is
+    available, without touching the global event loop policy.
+    """
+    if uvloop is not None:
+        # uvloop reaps child processes itself
+        return uvloop.new_event_loop()
+
+    loop = asyncio.new_event_loop()
+    asyncio.get_child_watcher().attach_loop(loop)
+    return loop
 
 app = Quart(__name__)
 cors(app)
@@ -29,15 +44,28 @@ nodes_collection = bootnode_db.nodes
 updates_collection = bootnode_db.updates
 node_statuses = bootnode_db.node_statuses
 
+# Kept for the life of the update loop, so their watches stay current
+watched_bootnodes = {}
+
+async def watched_bootnode(zone, provider):
+    bootnode = watched_bootnodes.get((provider, zone))
+    if bootnode is None:
+        bootnode = watched_bootnodes[(provider, zone)] = \
+            Bootnode('casper', 'testnet', provider, zone)
+        await bootnode.kube.watch()
+    return bootnode
+
 # set up system update loop
 async def update_nodes_lambda(date, zone, provider):
     print('updating', date, zone, provider)
     print('-------- Getting ' + provider + ' nodes in zone: ' + zone + ' --------')
-    bootnode = Bootnode('casper', 'testnet', provider, zone)
+    bootnode = await watched_bootnode(zone, provider)
 
-    deployments = [d.to_dict() for d in await bootnode.list_deployments()]
-    services = [s.to_dict() for s in await bootnode.list_services()]
-    pods = [p.to_dict() for p in await bootnode.list_pods()]
+    pods, services, deployments = await bootnode.list_all()
+
+    deployments = [d.to_dict() for d in deployments]
+    services = [s.to_dict() for s in services]
+    pods = [p.to_dict() for p in pods]
 
     nodes = to_nodes(deployments, services, pods, zone)
 
@@ -127,8 +155,11 @@ async def update_nodes_loop():
 def update_nodes_thread():
     print('starting update thread')
 
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(update_nodes_loop())
+    with asyncio.Runner(loop_factory=new_event_loop) as runner:
+        # Most gathered listings finish without suspending, run them eagerly (3.12+)
+        if hasattr(asyncio, 'eager_task_factory'):
+            runner.get_loop().set_task_factory(asyncio.eager_task_factory)
+        runner.run(update_nodes_loop())
 
 Thread(target=update_nodes_thread).start()
 
@@ -236,23 +267,25 @@ async def put_node():
             })
 
         bootnode = Bootnode('casper', 'testnet', provider, zone)
+        try:
+            number = 1
+            if json['number'] is not None:
+                number = int(json['number'])
 
-        number = 1
-        if json['number'] is not None:
-            number = int(json['number'])
-
-        nodes = []
+            nodes = []
 
-        ds = []
-        for i in range(number):
+            ds = []
+            for i in range(number):
 
-            async def create_deployment():
-                data = await bootnode.create_deployment()
-                # print('deployment created', data.deployment)
+                async def create_deployment():
+                    data = await bootnode.create_deployment()
+                    # print('deployment created', data.deployment)
 
-            ds.append(create_deployment())
+                ds.append(create_deployment())
 
-        await asyncio.gather(*ds)
+            await asyncio.gather(*ds)
+        finally:
+            await bootnode.close()
 
         return jsonify({
             'status': 'success',
@@ -276,10 +309,14 @@ async def get_node(node_id, provider=None, zone=None):
             zone = json['zone']
 
         bootnode = Bootnode('casper', 'testnet', provider, zone)
-
-        deployment = await bootnode.get_deployment(node_id)
-        service = await bootnode.get_service(node_id)
-        pods = [p.to_dict() for p in await bootnode.list_pods(label_selector='app=' + node_id)]
+        try:
+            deployment, service, pods = await asyncio.gather(
+                bootnode.get_deployment(node_id),
+                bootnode.get_service(node_id),
+                bootnode.list_pods(label_selector='app=' + node_id))
+        finally:
+            await bootnode.close()
+        pods = [p.to_dict() for p in pods]
 
         return jsonify(to_nodes([deployment.to_dict()],
                                 [service.to_dict()], pods, zone))
@@ -304,7 +341,10 @@ async def delete_node(node_id, provider=None, zone=None):
             zone = json['zone']
 
         bootnode = Bootnode('casper', 'testnet', provider, zone)
-        await bootnode.delete_deployment(node_id)
+        try:
+            await bootnode.delete_deployment(node_id)
+        finally:
+            await bootnode.close()
 
         return jsonify({
             'status': 'ok',
@@ -318,4 +358,5 @@ async def delete_node(node_id, provider=None, zone=None):
         })
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port='4000')
+    with asyncio.Runner(loop_factory=new_event_loop) as runner:
+        runner.run(app.run_task(host='0.0.0.0', port=4000, debug=True))
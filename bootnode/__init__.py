@@ -3,4 +3,3 @@ from . import kubernetes
 from .kubernetes import Kubernetes
 from .gcloud import Gcloud
 from .bootnode import Bootnode
-from .complete import complete
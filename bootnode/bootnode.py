@@ -1,11 +1,10 @@
 from .gcloud import Gcloud
 from .kubernetes import Kubernetes
-from .template import Ethereum, Casper, Service, Ingress, Backend, ServicePort
+from .template import BLOCKCHAINS, Service, Ingress, Backend, ServicePort
 from .table import table
 import secrets
 import asyncio
 
-blockchains = [Ethereum, Casper]
 gcloud = Gcloud()
 
 class Bootnode(object):
@@ -13,44 +12,51 @@ class Bootnode(object):
         self.gcloud = gcloud
 
         self.chain = self.find_blockchain(chain)
+        if self.chain is None:
+            raise Exception(f'Blockchain "{chain}" does not exist')
+
+        self._chain_name = self.chain.get_name()
         self.network, id = self.chain.normalize_network(network)
         self.zone = zone
         self.provider = provider
 
-        if self.chain is None:
-            raise Exception('Blockchain "" does not exist' % chain)
-
         if provider == 'private-cloud':
-            self.cluster = '{0}-{1}-encloudify-{2}'.format(self.chain.get_name(),
+            self.cluster = '{0}-{1}-encloudify-{2}'.format(self._chain_name,
                                             network,
                                             zone)
         else:
-            self.cluster = '{0}-{1}-{2}'.format(self.chain.get_name(),
+            self.cluster = '{0}-{1}-{2}'.format(self._chain_name,
                                             network,
                                             zone)
 
+        # New clusters have no config to build a client from yet
+        self.kube = None
         try:
             self.kube    = Kubernetes('config/{0}/cluster.yaml'.format(self.cluster))
         except Exception as e:
             print('{0} is a new cluster: '.format(self.cluster) + str(e))
 
+    async def close(self):
+        if self.kube is not None:
+            await self.kube.close()
+
     # Disks
     def list_disks(self, network=None):
-        table(self.gcloud.list_disks(network=network), 'name', 'status', 'link')
+        table(self.gcloud.iter_disks(network=network), 'name', 'status', 'link')
 
     def create_disk(self, snapshot, name):
         snap = self.gcloud.get_snapshot(snapshot)
         print(snap.create_disk(name))
 
     def get_disk(self, name):
-        table(self.gcloud.get_disk(name), ['name', 'status', 'link'])
+        table(self.gcloud.get_disk(name), 'name', 'status', 'link')
 
     def get_last_disk(self, network=None):
         table(self.gcloud.last_disk(network=network), 'name', 'status', 'link')
 
     # Snapshots
     def list_snapshots(self, network=None):
-        table(self.gcloud.list_snapshots(network=network), 'name', 'status', 'link')
+        table(self.gcloud.iter_snapshots(network=network), 'name', 'status', 'link')
 
     def get_snapshot(self, name):
         table(self.gcloud.get_snapshot(name), 'name', 'status', 'link')
@@ -61,38 +67,48 @@ class Bootnode(object):
     async def snapshot_disk(self, name):
         disk = self.gcloud.get_disk(name)
         pod  = await self.kube.get_pod(disk.pod)
-        print(self.gcloud.snapshot_pod(pod))
+        print(await self.snapshot_synced_pod(pod))
 
     async def snapshot_pod(self, name):
         pod = await self.kube.get_pod(name)
-        print(self.gcloud.snapshot_pod(pod))
+        print(await self.snapshot_synced_pod(pod))
+
+    async def snapshot_synced_pod(self, pod):
+        """
+        Snapshot a running pod, as long as it is synced.
+        """
+        syncing, block_number = await asyncio.gather(pod.syncing(),
+                                                     pod.block_number())
+        if syncing:
+            raise Exception('Pod not synced: "%s"' % pod.name)
+
+        return self.gcloud.snapshot_pod(pod, block_number)
 
-    async def update_snapshot(self):
+    async def update_snapshot(self, network=None):
+        if network is None:
+            network = self.network
         if not network:
             raise Exception('Network must be specified')
 
         # Re-use last snapshot so subsequent snapshots are just deltas,
         # otherwise find any sync'd pod and start there
-        snap = self.gcloud.get_last_snapshot(network=self.network)
+        snap = self.gcloud.get_last_snapshot(network=network)
         if snap:
             pod = await self.kube.get_pod(snap.pod)
         else:
-            pod = await self.kube.get_synced_pod(self.network)
+            pod = await self.kube.get_synced_pod(network)
 
-        if not pod or pod.syncing():
-            raise Exception('Pod not synced: ""' % pod.name)
+        if not pod:
+            raise Exception('No synced pod for network: "%s"' % network)
 
-        name = "{0}-{1}-{2}".format(pod.client, pod.network, pod.block_number())
-        print(self.gcloud.snapshot_disk(pod.disk, name, pod_name=pod.name))
+        print(await self.snapshot_synced_pod(pod))
 
     def find_blockchain(self, chain):
         """
         Find constructor to use for given blockchain node, i.e. Ethereum()
         which generates a config for `geth`.
         """
-        for blockchain in blockchains:
-            if blockchain.is_blockchain(chain):
-                return blockchain
+        return BLOCKCHAINS.get(chain)
 
     async def create_load_balancer(self, name=None):
         """
@@ -140,7 +156,7 @@ class Bootnode(object):
         """
 
         if not name:
-            name = '{0}-{1}-{2}'.format(self.chain.get_name(), self.network, secrets.randbelow(1000000000000))
+            name = '{0}-{1}-{2}'.format(self._chain_name, self.network, secrets.randbelow(1000000000000))
 
         print('Creating pod {0}'.format(name))
         config = self.chain(name, self.network, self.cluster).spec.template
@@ -148,9 +164,11 @@ class Bootnode(object):
         disk_name = config.spec.volumes[0].gcePersistentDisk.pdName
         snap = self.gcloud.get_last_snapshot(self.network)
         if snap:
-            snap.create_disk(disk_name)
+            op = snap.create_disk(disk_name)
+            await self.gcloud.wait_operations([op], snap.project, snap.zone)
         else:
-            self.gcloud.create_disk(disk_name)
+            op = self.gcloud.create_disk(disk_name)
+            await self.gcloud.wait_operations([op])
 
         # pool = self.kube.get_pool(network)
         # if not pool:
@@ -170,13 +188,13 @@ class Bootnode(object):
         return pods
 
     async def get_pod(self, name):
-        table(await self.kube.get_pod(name), 'name', 'phase', 'ip')
+        table(await self.kube.get_pod(name), 'name', 'status', 'ip')
 
     async def get_last_pod(self):
-        table(await self.kube.get_last_pod(network=self.network), 'name', 'phase', 'block_number', 'ip')
+        table(await self.kube.get_last_pod(network=self.network), 'name', 'status', 'ip')
 
     async def get_synced_pod(self):
-        table(await self.kube.get_synced_pod(network=self.network), 'name', 'phase', 'block_number', 'ip')
+        table(await self.kube.get_synced_pod(network=self.network), 'name', 'status', 'ip')
 
     async def create_deployment(self, name=None):
         """
@@ -185,7 +203,7 @@ class Bootnode(object):
         """
 
         if not name:
-            name = '{0}-{1}-{2}'.format(self.chain.get_name(), self.network, secrets.randbelow(1000000000000))
+            name = '{0}-{1}-{2}'.format(self._chain_name, self.network, secrets.randbelow(1000000000000))
 
         config = self.chain(name, self.network, self.cluster)
 
@@ -271,9 +289,18 @@ class Bootnode(object):
 
         return service
 
+    async def list_all(self, network=None):
+        """
+        List pods, services and deployments for a network concurrently.
+        """
+        if network is None:
+            network = self.network
+
+        return await self.kube.list_all(network=network)
+
     async def get_block_number(self, name):
         pod = await self.kube.get_pod(name)
-        print(pod.block_number())
+        print(await pod.block_number())
 
     # Cluster
     def create_cluster(self):
@@ -282,7 +309,7 @@ class Bootnode(object):
         chain.  Ex. geth-mainnet
         """
 
-        print(self.gcloud.create_cluster(self.chain.get_name(), self.network,
+        print(self.gcloud.create_cluster(self._chain_name, self.network,
                                          self.zone))
 
     def delete_cluster(self):
@@ -291,8 +318,6 @@ class Bootnode(object):
         chain.  Ex. geth-mainnet
         """
 
-        chain_name = self.chain.get_name()
-
         print(self.gcloud.delete_cluster(self.cluster))
 
     def list_clusters(self):
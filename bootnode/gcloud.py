@@ -1,83 +1,158 @@
 from google.cloud import container_v1
-from oauth2client.client import GoogleCredentials
-from protobuf_to_dict import protobuf_to_dict as pbd
 from googleapiclient import discovery
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from googleapiclient.model import JsonModel
+from google_auth_httplib2 import AuthorizedHttp
+from cachetools import TTLCache
+from operator import attrgetter
+import asyncio
+import functools
+import json
+import orjson
 import re
+import threading
+
+__all__ = ['Gcloud', 'OrjsonModel', 'Cluster', 'NodePool', 'Disk',
+           'Snapshot', 'project_zone_from_disk', 'type_from_url',
+           'network_filter', 'ssd_type', 'discovery_api',
+           'execute_in_thread']
 
 PROJECT = 'hanzo-ai'
 REGION  = 'us-central1'
 ZONE    = 'us-central1-a'
+CACHE_TTL = 30
+MAX_RESULTS = 500
+NEWEST = 'creationTimestamp desc'
+
+# Snapshots are named client-network-block, see Gcloud.snapshot_pod
+SNAPSHOT_RE = re.compile(r'([^-]+)-([^-]+)-(\d+)')
 
 def project_zone_from_disk(s):
     """
     Helper to pull project id and zone off a disk URI.
     """
-    match = re.match(r'.*v1/projects/(.*)/zones/(.*)/disk', s)
-    return match[1], match[2]
+    parts = s.split('/')
+    i = parts.index('projects')
+    return parts[i + 1], parts[i + 3]
 
 
 def type_from_url(s):
     """
     Get disk type from disk URI.
     """
-    match = re.match(r'.*diskTypes/(.*)', s)
-    return match[1]
+    return s.rpartition('/')[2]
+
+
+def network_filter(network, rest='[0-9]+'):
+    """
+    Return a list filter matching names of the form client-network-rest,
+    by default snapshots named client-network-block.
+    """
+    # network is user input, match it literally
+    return "name eq '[^-]+-{0}-{1}'".format(re.escape(network), rest)
+
+
+# Per worker thread Http, see execute_in_thread
+_local = threading.local()
+
+
+def execute_in_thread(request):
+    """
+    Execute a request on the current worker thread. The shared discovery
+    client's httplib2.Http isn't thread-safe, so each thread gets its own,
+    authorized with the client's credentials.
+    """
+    http = getattr(_local, 'http', None)
+    if http is None:
+        http = _local.http = AuthorizedHttp(request.http.credentials,
+                                            http=build_http())
+    return request.execute(http=http)
 
 
+@functools.lru_cache(maxsize=8)
 def ssd_type(project, zone):
     """
     Return URI for SSD Disk type formatted to match gcloud requirements.
     """
-    return "projects/{0}/zones/{1}/diskTypes/pd-ssd".format(project, zone)
+    return f"projects/{project}/zones/{zone}/diskTypes/pd-ssd"
+
+
+class OrjsonModel(JsonModel):
+    """
+    JsonModel which decodes API responses with orjson.
+    """
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than json (NaN, huge ints), let json decide
+            # and raise if the body really isn't JSON
+            body = json.loads(content)
+
+        if self._data_wrapper and 'data' in body:
+            body = body['data']
+        return body
+
+
+@functools.lru_cache(maxsize=None)
+def discovery_api(service, version):
+    """
+    Build a client for a Google API once, from the discovery document shipped
+    with googleapiclient, and reuse it for every later call.
+    """
+    return discovery.build(service, version, model=OrjsonModel(),
+                           static_discovery=True)
 
 
 class NodePool(object):
     """
-    GKE NodePool, annotated with values we care about.
+    GKE NodePool protobuf, annotated with values we care about.
     """
 
     def __init__(self, obj, api=None):
         self.gke_api            = api
-        self.name               = obj['name']
-        self.id                 = obj['name']  # NodePools do not seem to have an ID
-        self.link               = obj['self_link']
-        self.status             = obj['status']
-        self.config             = obj['config']
-        self.autoscaling        = obj['autoscaling']
-        self.initial_node_count = obj['initial_node_count']
-        self.management         = obj['management']
-        self.version            = obj['version']
-        self.instance_group     = obj['instance_group_urls']
+        self.name               = obj.name
+        self.id                 = obj.name  # NodePools do not seem to have an ID
+        self.link               = obj.self_link
+        self.status             = obj.status
+        self.config             = obj.config
+        self.autoscaling        = obj.autoscaling
+        self.initial_node_count = obj.initial_node_count
+        self.management         = obj.management
+        self.version            = obj.version
+        self.instance_group     = obj.instance_group_urls
 
 
 class Cluster(object):
     """
-    GKE Cluster, annotated with values we care about.
+    GKE Cluster protobuf, annotated with values we care about.
     """
 
     def __init__(self, obj, api=None):
         self.gke_api            = api
-        self.name               = obj['name']
-        self.id                 = obj['name']  # Clusters do not seem to have an ID
-        self.created_at         = obj['create_time']
-        self.link               = obj['self_link']
-        self.status             = obj['status']
-        self.zone               = obj['zone']
-        self.endpoint           = obj['endpoint']
-        self.ip                 = obj['endpoint']
-        self.version            = obj['current_master_version']
-        self.master_version     = obj['current_master_version']
-        self.node_version       = obj['current_node_version']
-        self.node_count         = obj['current_node_count']
-        self.node_config        = obj['node_config']
-        self.master_auth        = obj['master_auth']
+        self.name               = obj.name
+        self.id                 = obj.name  # Clusters do not seem to have an ID
+        self.created_at         = obj.create_time
+        self.link               = obj.self_link
+        self.status             = obj.status
+        self.zone               = obj.zone
+        self.endpoint           = obj.endpoint
+        self.ip                 = obj.endpoint
+        self.version            = obj.current_master_version
+        self.master_version     = obj.current_master_version
+        self.node_version       = obj.current_node_version
+        self.node_count         = obj.current_node_count
+        self.node_config        = obj.node_config
+        self.master_auth        = obj.master_auth
 
         # Not in the dict
-        # self.maintenance_policy = obj['maintenance_policy']
-        self.locations          = obj['locations']
-        self.instance_groupl    = obj['instance_group_urls']
+        # self.maintenance_policy = obj.maintenance_policy
+        self.locations          = obj.locations
+        self.instance_groupl    = obj.instance_group_urls
 
-        self.node_pools = [NodePool(o, api) for o in obj['node_pools']]
+        self.node_pools = [NodePool(o, api) for o in obj.node_pools]
 
 
 class Disk(object):
@@ -85,6 +160,10 @@ class Disk(object):
     GCE Disk, annotated with values we care about.
     """
 
+    __slots__ = ('gce_api', 'name', 'id', 'created_at', 'link', 'status',
+                 'size', 'pod', 'network', 'source_image', 'source_image_id',
+                 '_type_url', '_type', '_location')
+
     def __init__(self, obj, api=None):
         self.gce_api    = api
         self.name       = obj['name']
@@ -93,15 +172,24 @@ class Disk(object):
         self.link       = obj['selfLink']
         self.status     = obj['status']
         self.size       = obj['sizeGb']
-        self.type       = type_from_url(obj['type'])
+
+        # Parsed from URIs on first access, most listings never read them
+        self._type_url = obj['type']
+        self._type     = None
+        self._location = None
 
         labels = obj.get('labels', None)
         if labels:
-            self.pod = labels['pod-name']
+            self.pod     = labels['pod-name']
+            self.network = labels.get('network')
         else:
-            self.pod = None
+            self.pod     = None
+            self.network = None
 
-        self.project, self.zone = project_zone_from_disk(self.link)
+        # Disks named after their pod still tell us the network
+        if self.network is None:
+            bits = self.name.split('-')
+            self.network = bits[1] if len(bits) > 2 else None
 
         self.source_image    = None
         self.source_image_id = None
@@ -110,20 +198,45 @@ class Disk(object):
             self.source_image    = obj['sourceImage']
             self.source_image_id = obj['sourceImageId']
 
+    @property
+    def type(self):
+        if self._type is None:
+            self._type = type_from_url(self._type_url)
+        return self._type
+
+    @property
+    def project(self):
+        if self._location is None:
+            self._location = project_zone_from_disk(self.link)
+        return self._location[0]
+
+    @property
+    def zone(self):
+        if self._location is None:
+            self._location = project_zone_from_disk(self.link)
+        return self._location[1]
+
 
 class Snapshot(object):
     """
     GCE Snapshot, annotated with values we care about.
     """
 
+    __slots__ = ('gce_api', 'name', 'client', 'network', 'block', 'pod', 'id',
+                 'created_at', 'disk_size', 'link', 'source_disk',
+                 'source_disk_id', 'status', 'storage_bytes',
+                 'storage_byts_status', 'project', 'zone')
+
     def __init__(self, obj, api=None):
         self.gce_api = api
         self.name    = obj['name']
 
-        bits = self.name.split('-')
-        self.client  = bits[0]
-        self.network = bits[1]
-        self.block   = int(bits[2])
+        m = SNAPSHOT_RE.match(self.name)
+        if m is None:
+            raise ValueError('Snapshot not named client-network-block: "%s"' % self.name)
+        self.client  = m[1]
+        self.network = m[2]
+        self.block   = int(m[3])
 
         labels = obj.get('labels', None)
         if labels:
@@ -160,9 +273,13 @@ class Gcloud(object):
         self.project = project
         self.region  = region
         self.zone    = zone
-        self.gce_api = discovery.build('compute', 'v1')
+        self.gce_api = discovery_api('compute', 'v1')
         self.gke_api = container_v1.ClusterManagerClient()
 
+        # Recently fetched disks and snapshots, by name
+        self._disks     = TTLCache(maxsize=256, ttl=CACHE_TTL)
+        self._snapshots = TTLCache(maxsize=256, ttl=CACHE_TTL)
+
     # Disks
     def create_disk(self, name, snapshot, project=None, zone=None):
         """
@@ -175,10 +292,11 @@ class Gcloud(object):
 
         body = {
             'name': name,
-            'description': 'from-pod: {0} from-snapshot: {1}'.format(snapshot.pod, snapshot.name),
+            'description': f'from-pod: {snapshot.pod} from-snapshot: {snapshot.name}',
             'labels': {
                 'snapshot-name': snapshot.name,
                 'pod-name':      snapshot.pod,
+                'network':       snapshot.network,
                 'project':       project,
                 'zone':          zone,
             },
@@ -193,42 +311,100 @@ class Gcloud(object):
         """
         Get a specific disk by name.
         """
-        for disk in self.list_disks():
-            if disk.name == name:
-                return disk
+        disk = self._disks.get(name)
+        if disk is None:
+            try:
+                obj = self.gce_api.disks().get(project=self.project, zone=self.zone,
+                                               disk=name).execute()
+            except HttpError as e:
+                if e.resp.status == 404:
+                    return None
+                raise
+            disk = self._disks[name] = Disk(obj, self)
+        return disk
 
     def get_last_disk(self, network=None):
         """
         Get last disk created.
         """
-        return max(self.list_disks(network), key=lambda x: x.created_at)
+        if network:
+            # The API won't order a listing filtered on another field
+            return max(self.iter_disks(network), key=attrgetter('created_at'),
+                       default=None)
+        return next(self.iter_disks(order_by=NEWEST, max_results=1), None)
+
+    def iter_disks(self, network=None, order_by=None, max_results=MAX_RESULTS):
+        """
+        Iterate over disks for project / zone a page at a time, optionally
+        filter by network. Ordering only applies to unfiltered listings.
+        """
+        params = {}
+        if network:
+            # By name, only disks created from a snapshot carry a network label
+            params['filter'] = network_filter(network, '.+')
+        elif order_by:
+            params['orderBy'] = order_by
+
+        disks   = self.gce_api.disks()
+        request = disks.list(project=self.project, zone=self.zone,
+                             maxResults=max_results, **params)
+        while request is not None:
+            response = request.execute()
+            for obj in response.get('items', []):
+                disk = self._disks[obj['name']] = Disk(obj, self)
+                yield disk
+            request = disks.list_next(request, response)
 
     def list_disks(self, network=None):
         """
         List disks for project / zone, optionally filter by network.
         """
-        disks = [Disk(s, self) for s in
-                 self.gce_api.disks().list(project=self.project, zone=self.zone).execute()['items']]
-
-        if not network:
-            return disks
-
-        return [s for s in disks if s.network == network]
+        return list(self.iter_disks(network))
 
     # Snapshots
     def get_snapshot(self, name):
         """
         Get a snapshot by name.
         """
-        for snap in self.list_snapshots():
-            if snap.name == name:
-                return snap
+        snap = self._snapshots.get(name)
+        if snap is None:
+            try:
+                obj = self.gce_api.snapshots().get(project=self.project,
+                                                   snapshot=name).execute()
+            except HttpError as e:
+                if e.resp.status == 404:
+                    return None
+                raise
+            snap = self._snapshots[name] = Snapshot(obj, self)
+        return snap
 
     def get_last_snapshot(self, network=None):
         """
         Get snapshot with highest block number.
         """
-        return max(self.list_snapshots(network), key=lambda x: x.block)
+        return max(self.iter_snapshots(network), key=attrgetter('block'),
+                   default=None)
+
+    def iter_snapshots(self, network=None, max_results=MAX_RESULTS):
+        """
+        Iterate over all snapshots for a given network a page at a time.
+
+        :param network: The name of the network
+        :return: Yields snapshots, parsed into objects
+        """
+        params = {}
+        if network:
+            params['filter'] = network_filter(network)
+
+        snapshots = self.gce_api.snapshots()
+        request   = snapshots.list(project=self.project, maxResults=max_results,
+                                   **params)
+        while request is not None:
+            response = request.execute()
+            for obj in response.get('items', []):
+                snap = self._snapshots[obj['name']] = Snapshot(obj, self)
+                yield snap
+            request = snapshots.list_next(request, response)
 
     def list_snapshots(self, network=None):
         """
@@ -237,13 +413,7 @@ class Gcloud(object):
         :param network: The name of the network
         :return: Returns the list of snapshots, parsed into objects
         """
-        snaps = [Snapshot(s, self) for s in
-                 self.gce_api.snapshots().list(project=self.project).execute()['items']]
-
-        if not network:
-            return snaps
-
-        return [s for s in snaps if s.network == network]
+        return list(self.iter_snapshots(network))
 
     def snapshot_disk(self, disk, name, pod_name=None, project=None, zone=None):
         """
@@ -266,22 +436,20 @@ class Gcloud(object):
                 'project':  project,
                 'zone':     zone,
             },
-            'description': 'from-pod: {0}'.format(pod_name)
+            'description': f'from-pod: {pod_name}'
         }
 
         return self.gce_api.disks().createSnapshot(project=project, zone=zone,
                                                    disk=disk,
                                                    body=body).execute()
 
-    def snapshot_pod(self, pod, project=None, zone=None):
+    def snapshot_pod(self, pod, block_number, project=None, zone=None):
         """
-        Snapshot a running pod, as long as it is synced.
+        Snapshot the disk of a synced pod, named after the block it is at.
         """
-        if pod.syncing():
-            raise Exception('Pod not synced: ""' % pod.name)
-
-        name = "{0}-{1}-{2}".format(pod.client, pod.network, pod.block_number())
-        return self.snapshot_disk(pod.disk, name, pod_name=pod.name)
+        name = f"{pod.client}-{pod.network}-{block_number}"
+        return self.snapshot_disk(pod.disk, name, pod_name=pod.name,
+                                  project=project, zone=zone)
 
     # Clusters
     def create_cluster(self, chain, network, zone=None, retry=None, timeout=None):
@@ -348,8 +516,7 @@ class Gcloud(object):
             },
         }
 
-        credentials = GoogleCredentials.get_application_default()
-        service = discovery.build('container', 'v1', credentials=credentials)
+        service = discovery_api('container', 'v1')
         return service.projects().zones().clusters().create(projectId=self.project, zone=zone, body=body).execute()
         # self.gke_api.create_cluster(self.project, zone, cluster)
 
@@ -360,8 +527,7 @@ class Gcloud(object):
         if not zone:
             zone = self.zone
 
-        credentials = GoogleCredentials.get_application_default()
-        service = discovery.build('container', 'v1', credentials=credentials)
+        service = discovery_api('container', 'v1')
         return service.projects().zones().clusters().delete(projectId=self.project,
                                                             zone=zone,
                                                             clusterId=cluster_id).execute()
@@ -372,8 +538,8 @@ class Gcloud(object):
         all zones.
         """
         return [Cluster(c, self) for c in
-                pbd(self.gke_api.list_clusters(self.project, self.zone, retry,
-                                               timeout))['clusters']]
+                self.gke_api.list_clusters(self.project, self.zone, retry,
+                                           timeout).clusters]
 
     def get_cluster(self, cluster_id, zone=None, retry=None, timeout=None):
         """
@@ -382,13 +548,39 @@ class Gcloud(object):
         if not zone:
             zone = self.zone
 
-        credentials = GoogleCredentials.get_application_default()
-        service = discovery.build('container', 'v1', credentials=credentials)
+        service = discovery_api('container', 'v1')
         return service.projects().zones().clusters().get(projectId=self.project,
                                                          zone=zone,
                                                          clusterId=cluster_id).execute()
 
     # Misc operations
+    async def wait_operations(self, ops, project=None, zone=None, poll=1.0):
+        """
+        Wait for a batch of zone operations to finish, polling all of them
+        with a single list request per tick. The blocking API call runs on a
+        worker thread so the event loop keeps serving while we wait.
+        """
+        if not project:
+            project = self.project
+        if not zone:
+            zone = self.zone
+
+        ids = ' OR '.join('(id = {0})'.format(op['id']) for op in ops)
+        while True:
+            request = self.gce_api.zoneOperations().list(project=project, zone=zone,
+                                                         filter=ids)
+            done = (await asyncio.to_thread(execute_in_thread, request)).get('items', [])
+
+            # Every operation has to be listed, an empty page is not success
+            if len(done) >= len(ops) and all(op['status'] == 'DONE' for op in done):
+                break
+            await asyncio.sleep(poll)
+
+        for op in done:
+            if 'error' in op:
+                raise Exception('Operation failed: "{0}"'.format(op['name']))
+        return done
+
     def cancel_operation(self, operation_id, retry=None, timeout=None):
         """
         Cancels the specified operation.
@@ -1,9 +1,64 @@
-from kubernetes_asyncio import client, config
-from kubernetes.stream import stream
+from kubernetes_asyncio import client, config, watch
+from kubernetes_asyncio.client.rest import ApiException
+from kubernetes_asyncio.stream import WsApiClient
+from dataclasses import dataclass, field
+from typing import Any
+import aiohttp
 import asyncio
+import functools
+import logging
+from operator import attrgetter
+import orjson
+import re
+import time
 
 NAMESPACE = 'default'
 
+# Connections kept open to the apiserver, enough for our gather fan-outs
+POOL_SIZE = 64
+
+# Seconds a pod listing is reused for before asking the apiserver again
+POD_CACHE_TTL = 2
+
+# Seconds a pod listing may still be served for when the apiserver fails
+POD_CACHE_STALE = 5 * POD_CACHE_TTL
+
+# Seconds a watch runs before we relist from scratch
+WATCH_RESYNC = 300
+
+# client-network[-number[-...]], number only when it is a whole segment
+NAME_RE = re.compile(r'([^-]+)-([^-]+)(?:-(\d+)(?:-|$))?')
+
+log = logging.getLogger(__name__)
+
+# Command prefix for evaluating javascript in a running geth
+GETH_EXEC = ('/bin/geth', '--datadir=/data', 'attach', '--exec')
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_name(name):
+    """
+    Split a name following the client-network-number scheme into its parts.
+    """
+    m = NAME_RE.match(name)
+    if m is None:
+        log.debug('probably not one of ours: %s', name)
+        return '', '', -1
+
+    # Resource may not follow correct naming scheme
+    client, network, number = m.groups()
+    return client, network, int(number) if number else -1
+
+
+async def _read(call, *args, **kwargs):
+    """
+    Call an API method and parse the JSON body ourselves, our wrappers only
+    need a few fields so skip building the full V1 models.
+    """
+    resp = await call(*args, _preload_content=False, **kwargs)
+    return orjson.loads(await resp.read())
+
+
 class Node(object):
     def __init__(self, node, api=None):
         self.api  = api
@@ -16,39 +71,32 @@ class Pool(object):
         self.pool = pool
 
 
-class Pod(object):
-    def __init__(self, pod, api=None):
-        self.api = api
-        self.pod = pod
+@dataclass(slots=True, frozen=True)
+class Pod:
+    name:    str
+    status:  str
+    ip:      str
+    client:  str
+    network: str
+    number:  int
+    disk:    str
+    api:     Any = field(default=None, compare=False, repr=False)
 
-        name = pod.metadata.name
-        self.name = name
+    @classmethod
+    def from_api(cls, pod, api=None):
+        name   = pod['metadata']['name']
+        status = pod.get('status', {})
 
-        self.status = pod.status.phase
-        self.ip     = pod.status.host_ip
+        # Pod names should follow client-network-number scheme
+        client, network, number = _parse_name(name)
 
-        try:
-            # Pod names should follow client-network-number scheme
-            bits = name.split('-')
-            self.client  = bits[0]
-            self.network = bits[1]
+        # Currently only support directly attached gce persistent disks
+        volumes = pod['spec'].get('volumes')
+        pd = volumes[0].get('gcePersistentDisk') if volumes else None
+        disk = pd.get('pdName') if pd else None
 
-            # Currently only support directly attached gce persistent disks
-            try:
-                self.disk = pod.spec.volumes[0].gce_persistent_disk.pd_name
-            except Exception:
-                self.disk = 'unknown'
-
-            # Pod may not follow correct naming scheme
-            if len(bits) > 2:
-                self.number = int(bits[2])
-            else:
-                self.number = -1
-        except Exception as e:
-            print('warning: probably not one of ours: ' + str(e))
-            self.client = ''
-            self.network = ''
-            self.number = -1
+        return cls(name, status.get('phase'), status.get('hostIP'), client,
+                   network, number, disk or 'unknown', api)
 
     def to_dict(self):
         return {
@@ -60,47 +108,69 @@ class Pod(object):
             'ip': self.ip,
         }
 
-class Service(object):
-    def __init__(self, service, api=None):
-        self.api = api
-        self.service = service
+    async def exec(self, js):
+        return (await self.api.exec(self.name, [*GETH_EXEC, js])).strip().lower()
 
-        selector = service.spec.selector
+    async def syncing(self):
+        return await self.exec('eth.syncing') != 'false'
+
+    async def block_number(self):
+        try:
+            return int(await self.exec('eth.blockNumber'))
+        except Exception:
+            return -1
+
+    def __repr__(self):
+        return self.name
+
+@dataclass(slots=True, frozen=True)
+class Port:
+    port:     int
+    name:     str = None
+    nodePort: int = None
+
+    @classmethod
+    def from_api(cls, port):
+        return cls(port['port'], port.get('name'), port.get('nodePort'))
+
+@dataclass(slots=True, frozen=True)
+class Service:
+    name:    str
+    ip:      str
+    ports:   tuple
+    client:  str
+    network: str
+    number:  int
+    api:     Any = field(default=None, compare=False, repr=False)
+
+    @classmethod
+    def from_api(cls, service, api=None):
+        spec = service['spec']
+
+        selector = spec.get('selector')
         name = 'unknown-unknown'
         if selector is not None:
-            self.name = name = selector['app']
+            name = selector['app']
 
-        if service.status.load_balancer is not None and \
-           service.status.load_balancer.ingress is not None:
-            self.ip = service.status.load_balancer.ingress[0].ip
+        ingress = service.get('status', {}).get('loadBalancer', {}).get('ingress')
+        if ingress:
+            ip = ingress[0].get('ip')
         else:
-            self.ip = ''
+            ip = ''
 
-        self.ports = service.spec.ports
+        # Service names should follow client-network-number scheme
+        client, network, number = _parse_name(name)
 
-        try:
-            # Pod names should follow client-network-number scheme
-            bits = name.split('-')
-            self.client  = bits[0]
-            self.network = bits[1]
-
-            if len(bits) > 2:
-                self.number = int(bits[2])
-            else:
-                self.number = -1
-        except Exception as e:
-            print('warning: probably not one of ours: ' + str(e))
-            self.client = ''
-            self.network = ''
-            self.number = -1
+        # A tuple of frozen ports keeps the whole Service hashable
+        ports = tuple(Port.from_api(p) for p in spec.get('ports', ()))
+
+        return cls(name, ip, ports, client, network, number, api)
 
     def to_dict(self):
         ports = []
         for port in self.ports:
-            p =  {'port': port.port, 'name': port.name}
-            if hasattr(port, 'node_port'):
-                p['nodePort'] = port.node_port
-            ports.append(p)
+            ports.append({'port': port.port, 'name': port.name,
+                          'nodePort': port.nodePort})
         return {
             'name': self.name,
             'blockchain': self.client,
@@ -110,55 +180,22 @@ class Service(object):
             'ports': ports,
         }
 
-    # def exec(self, js):
-    #     command = [
-    #         '/bin/geth',
-    #         '--datadir=/data',
-    #         'attach',
-    #         '--exec',
-    #         js
-    #     ]
-    #     return self.api.exec(self.name, command).lower()
-
-    # def syncing(self):
-    #     if self.exec('eth.syncing').lower() == 'false':
-    #         return False
-    #     else:
-    #         return True
-
-    # def block_number(self):
-    #     try:
-    #         return int(self.exec('eth.blockNumber'))
-    #     except:
-    #         return -1
-
-    # def __repr__(self):
-    #     return self.name
-
-class Deployment(object):
-    def __init__(self, deployment, api=None):
-        self.api = api
-        self.deployment = deployment
-
-        name = deployment.metadata.name
-        self.name = name
+@dataclass(slots=True, frozen=True)
+class Deployment:
+    name:    str
+    client:  str
+    network: str
+    number:  int
+    api:     Any = field(default=None, compare=False, repr=False)
 
-        try:
-            # Pod names should follow client-network-number scheme
-            bits = name.split('-')
-            self.client  = bits[0]
-            self.network = bits[1]
-
-            # Pod may not follow correct naming scheme
-            if len(bits) > 2:
-                self.number = int(bits[2])
-            else:
-                self.number = -1
-        except Exception as e:
-            print('warning: probably not one of ours: ' + str(e))
-            self.client = ''
-            self.network = ''
-            self.number = -1
+    @classmethod
+    def from_api(cls, deployment, api=None):
+        name = deployment['metadata']['name']
+
+        # Deployment names should follow client-network-number scheme
+        client, network, number = _parse_name(name)
+
+        return cls(name, client, network, number, api)
 
     def to_dict(self):
         return {
@@ -168,28 +205,148 @@ class Deployment(object):
             'number': self.number,
         }
 
+class Lister(object):
+    """
+    In-memory copy of one kind of resource by name, kept current by
+    watching the apiserver from the resourceVersion of a full listing.
+    """
+    def __init__(self, list_fn, wrapper, api=None):
+        self.list_fn = list_fn
+        self.wrapper = wrapper
+        self.api     = api
+        self.items   = {}
+        self.synced  = asyncio.Event()
+        self.task    = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        while True:
+            try:
+                data = await _read(self.list_fn, NAMESPACE)
+                self.items = {i['metadata']['name']: self.wrapper.from_api(i, self.api)
+                              for i in data['items']}
+                self.synced.set()
+
+                # Watch ends after WATCH_RESYNC and we go round to relist
+                async with watch.Watch().stream(self.list_fn, NAMESPACE,
+                        resource_version=data['metadata']['resourceVersion'],
+                        timeout_seconds=WATCH_RESYNC) as stream:
+                    async for event in stream:
+                        if event['type'] == 'ERROR':
+                            break
+
+                        obj  = event['raw_object']
+                        name = obj['metadata']['name']
+                        if event['type'] == 'DELETED':
+                            self.items.pop(name, None)
+                        else:
+                            self.items[name] = self.wrapper.from_api(obj, self.api)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning('watch on %s failed: %s', self.wrapper.__name__, e)
+                await asyncio.sleep(1)
+
+    def list(self, network=None):
+        if not network:
+            return list(self.items.values())
+        return [i for i in self.items.values() if i.network == network]
+
 class Kubernetes(object):
     def __init__(self, config_path='config/ethereum-testnet/cluster.yaml'):
         self.config_path = config_path
+        self.api_client = None
         self.api = None
+        self.exec_api = None
 
-    async def init_apis(self):
-        if self.api is None:
-            api_client = await config.new_client_from_config(self.config_path)
+        # Guards client creation when the first calls arrive via gather
+        self.init_lock = asyncio.Lock()
+
+        # Recent pod listings by label selector, as (timestamp, pods)
+        self.pod_cache = {}
 
-            self.api = client.CoreV1Api(api_client)
-            self.apps_api = client.AppsV1Api(api_client)
+        # Watch-backed copies of pods, services and deployments, see watch()
+        self.listers = {}
+
+    async def init_apis(self):
+        if self.api is not None:
+            return
+
+        async with self.init_lock:
+            if self.api is None:
+                configuration = client.Configuration()
+                await config.load_kube_config(self.config_path,
+                                              client_configuration=configuration)
+                configuration.connection_pool_maxsize = POOL_SIZE
+
+                # One client, and so one connection pool, for every call.
+                # Its thread pool is only built on demand (kubernetes_asyncio
+                # 8.0.1+) and we never ask for it, everything here is async.
+                self.api_client = client.ApiClient(configuration)
+                self.apps_api = client.AppsV1Api(self.api_client)
+                self.api = client.CoreV1Api(self.api_client)
+
+    async def watch(self):
+        """
+        Serve pod, service and deployment listings from memory, kept current
+        by apiserver watches, for long running callers. Until the first
+        listing lands we keep asking the apiserver directly.
+        """
+        await self.init_apis()
+        if not self.listers:
+            self.listers = {
+                Pod:        Lister(self.api.list_namespaced_pod, Pod, self),
+                Service:    Lister(self.api.list_namespaced_service, Service, self),
+                Deployment: Lister(self.apps_api.list_namespaced_deployment, Deployment, self),
+            }
+            for lister in self.listers.values():
+                lister.start()
+
+    def watched(self, kind):
+        lister = self.listers.get(kind)
+        if lister is not None and lister.synced.is_set():
+            return lister
+
+    async def close(self):
+        for lister in self.listers.values():
+            lister.stop()
+        self.listers = {}
+
+        if self.api_client is not None:
+            await self.api_client.close()
+            self.api_client = self.api = self.apps_api = None
+
+        if self.exec_api is not None:
+            await self.exec_api.api_client.close()
+            self.exec_api = None
+
+    async def init_exec_api(self):
+        # Exec needs a websocket client, only build it for callers that exec
+        if self.exec_api is None:
+            configuration = client.Configuration()
+            await config.load_kube_config(self.config_path,
+                                          client_configuration=configuration)
+
+            self.exec_api = client.CoreV1Api(WsApiClient(configuration=configuration))
 
     async def exec(self, pod_name, command, namespace=NAMESPACE, stdin=False,
              stderr=True, stdout=True, tty=False):
-        await self.init_apis()
-        return await stream(self.api.connect_get_namespaced_pod_exec, pod_name,
+        await self.init_exec_api()
+        return await self.exec_api.connect_get_namespaced_pod_exec(pod_name,
                       namespace, command=command, stdin=stdin, stderr=stderr,
                       stdout=stdout, tty=tty)
 
     async def create_volume(self, config):
         await self.init_apis()
-        return await self.api.create_namespaced_persistent_volume_claim(NAMESPACE, body=config)
+        return await self.api.create_namespaced_persistent_volume_claim(NAMESPACE, body=config.to_dict())
 
     async def delete_volume(self, name):
         await self.init_apis()
@@ -201,16 +358,23 @@ class Kubernetes(object):
 
     async def create_service(self, config):
         await self.init_apis()
-        return Service(await self.api.create_namespaced_service(NAMESPACE, body=config), self)
+        return Service.from_api(await _read(self.api.create_namespaced_service, NAMESPACE, body=config.to_dict()), self)
 
     async def delete_service(self, name):
         await self.init_apis()
         return await self.api.delete_namespaced_service(name, NAMESPACE, body=client.V1DeleteOptions())
 
     async def list_services(self, network=None):
+        lister = self.watched(Service)
+        if lister is not None:
+            return lister.list(network)
+
         await self.init_apis()
-        services = [Service(p, self) for p in
-                (await self.api.list_namespaced_service(NAMESPACE)).items]
+
+        # Filter by the network in the name rather than the network label,
+        # services created before they were labelled don't carry it
+        services = [Service.from_api(p, self) for p in
+                (await _read(self.api.list_namespaced_service, NAMESPACE))['items']]
 
         if not network:
             return services
@@ -219,69 +383,114 @@ class Kubernetes(object):
 
     async def get_service(self, name):
         await self.init_apis()
-        return Service(await self.api.read_namespaced_service(name, NAMESPACE), self)
+        return Service.from_api(await _read(self.api.read_namespaced_service, name, NAMESPACE), self)
 
     async def create_pod(self, config):
         await self.init_apis()
-        return await self.api.create_namespaced_pod(NAMESPACE, body=config)
+        self.invalidate_pods()
+        return await self.api.create_namespaced_pod(NAMESPACE, body=config.to_dict())
 
     async def delete_pod(self, name):
         await self.init_apis()
+        self.invalidate_pods()
         return await self.api.delete_namespaced_pod(name, NAMESPACE, body=client.V1DeleteOptions())
 
     async def list_pods(self, label_selector=None, network=None):
+        lister = self.watched(Pod)
+        if lister is not None and label_selector is None:
+            return lister.list(network)
+
         await self.init_apis()
-        if label_selector is None:
-            pods = [Pod(p, self) for p in
-                    (await self.api.list_namespaced_pod(NAMESPACE)).items]
-        else:
-            pods = [Pod(p, self) for p in
-                    (await self.api.list_namespaced_pod(NAMESPACE, label_selector=label_selector)).items]
+        pods = await self._list_pods(label_selector)
 
+        # Filter by the network in the name, like Lister.list(), pods created
+        # before they were labelled don't carry a network label
         if not network:
             return pods
-
         return [p for p in pods if p.network == network]
 
+    async def _list_pods(self, label_selector=None):
+        cached = self.pod_cache.get(label_selector)
+        if cached and time.monotonic() - cached[0] < POD_CACHE_TTL:
+            return cached[1]
+
+        try:
+            pods = [Pod.from_api(p, self) for p in
+                    (await _read(self.api.list_namespaced_pod, NAMESPACE,
+                                 label_selector=label_selector))['items']]
+        except (ApiException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Serve a recent stale listing rather than nothing if we have one
+            if cached and time.monotonic() - cached[0] < POD_CACHE_STALE:
+                log.warning('listing pods failed, serving cached pods: %s', e)
+                return cached[1]
+            raise
+
+        self.pod_cache[label_selector] = (time.monotonic(), pods)
+        return pods
+
+    def invalidate_pods(self):
+        self.pod_cache.clear()
+
     async def get_pod(self, name):
         await self.init_apis()
-        for pod in await self.list_pods():
-            if pod.name == name:
-                return pod
-        raise Exception('Pod not found: "%s"' % name)
+        try:
+            return Pod.from_api(await _read(self.api.read_namespaced_pod, name, NAMESPACE), self)
+        except ApiException as e:
+            if e.status == 404:
+                raise Exception('Pod not found: "%s"' % name)
+            raise
 
     async def create_deployment(self, config):
         await self.init_apis()
-        return await self.apps_api.create_namespaced_deployment(NAMESPACE, body=config)
+        self.invalidate_pods()
+        return await self.apps_api.create_namespaced_deployment(NAMESPACE, body=config.to_dict())
 
     async def delete_deployment(self, name):
         await self.init_apis()
+        self.invalidate_pods()
         return await self.apps_api.delete_namespaced_deployment(name, NAMESPACE, body=client.V1DeleteOptions())
 
     async def list_deployments(self, network=None):
-        await self.init_apis()
-        deployments = [Deployment(p, self) for p in (await self.apps_api.list_namespaced_deployment(NAMESPACE)).items]
+        lister = self.watched(Deployment)
+        if lister is not None:
+            return lister.list(network)
 
-        if not network:
-            return deployments
+        await self.init_apis()
+        label_selector = 'network={0}'.format(network) if network else None
+        items = (await _read(self.apps_api.list_namespaced_deployment, NAMESPACE,
+                             label_selector=label_selector))['items']
 
-        return [p for p in deployments if p.network == network]
+        return [Deployment.from_api(p, self) for p in items]
 
     async def get_deployment(self, name):
         await self.init_apis()
-        return Deployment(await self.apps_api.read_namespaced_deployment(name, NAMESPACE), self)
+        return Deployment.from_api(await _read(self.apps_api.read_namespaced_deployment, name, NAMESPACE), self)
+
+    async def list_all(self, network=None):
+        # Build the clients before fanning out so the calls share them
+        await self.init_apis()
+        return await asyncio.gather(self.list_pods(network=network),
+                                    self.list_services(network=network),
+                                    self.list_deployments(network=network))
 
     async def get_last_pod(self, network=None):
         await self.init_apis()
-        return max(await self.list_pods(network), key=lambda x: x.number)
+        return max(await self.list_pods(network=network), key=attrgetter('number'),
+                   default=None)
 
     async def get_synced_pod(self, network=None):
         await self.init_apis()
-        pods = await self.list_pods(network)
-        for pod in sorted(pods, key=lambda x: x.number):
-            if not pod.syncing():
-                return pod
+        pods = await self.list_pods(network=network)
+
+        # Check every pod at once, a pod we can't reach just doesn't count
+        syncing = await asyncio.gather(*(pod.syncing() for pod in pods),
+                                       return_exceptions=True)
+
+        # Lowest numbered synced pod, in one pass rather than sorting first
+        return min((pod for pod, pod_syncing in zip(pods, syncing)
+                    if pod_syncing is False),
+                   key=attrgetter('number'), default=None)
 
     async def create_ingress(self, config):
         await self.init_apis()
-        await self.api.create_namespaced_ingress(NAMESPACE, config)
+        await self.api.create_namespaced_ingress(NAMESPACE, config.to_dict())
@@ -1,5 +1,9 @@
 from tabulate import tabulate
-from collections import Iterable
+from collections.abc import Iterable
+from functools import partial
+from itertools import chain
+from operator import attrgetter
+from types import GeneratorType
 
 
 def attr(obj, a):
@@ -12,21 +16,47 @@ def attr(obj, a):
     return v
 
 
+def row_getter(obj, attrs):
+    """
+    Returns a function which fetches a row of attributes from objects like
+    obj, using attrgetter when no attribute needs calling or defaulting.
+    """
+    cls = type(obj)
+    plain = [not callable(getattr(cls, a, None)) and hasattr(obj, a) for a in attrs]
+
+    # Only attributes which need calling or defaulting go through attr()
+    if not all(plain):
+        fetchers = [attrgetter(a) if p else partial(attr, a=a)
+                    for a, p in zip(attrs, plain)]
+        return lambda o: [f(o) for f in fetchers]
+
+    getter = attrgetter(*attrs)
+    if len(attrs) == 1:
+        return lambda o: (getter(o),)
+    return getter
+
+
 def table(data, *attrs):
     """
-    Takes an object or list of objects and prints specified attributes in a
-    nicely formatted table.
+    Takes an object or iterable of objects and prints specified attributes in
+    a nicely formatted table.
     """
 
-    # Ensure data is iterable
-    if not isinstance(data, Iterable):
-        data = [data]
+    # Ensure data is iterable, checking the common cases before the ABC
+    if not isinstance(data, (list, tuple, GeneratorType)):
+        if isinstance(data, str) or not isinstance(data, Iterable):
+            data = [data]
 
     # Generate headers from attributes specified
     headers = [a.upper().replace('_', ' ') for a in attrs]
 
-    # Generate tabular data from list of objects
-    table   = [[attr(o, a) for a in attrs] for o in data]
+    # Pick the row fetcher from the first object, then let a single tabulate
+    # call size the columns over every row so they all line up
+    items = iter(data)
+    first = next(items, None)
+    if first is None:
+        print(tabulate([], headers=headers))
+        return
 
-    # Pretty print table and headers
-    print(tabulate(table, headers=headers))
+    row = row_getter(first, attrs)
+    print(tabulate(map(row, chain((first,), items)), headers=headers))
@@ -1,287 +1,352 @@
-import os.path
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import ClassVar
+from functools import lru_cache
+from types import MappingProxyType
 import secrets
 
-class Dict(dict):
-    def __init__(self, **kwargs):
-        dict.__init__(self, **kwargs)
-        self.__dict__ = self
-
-
-class Selector(Dict):
-    def __init__(self, matchLabels={}, match_expressions=[]):
-        Dict.__init__(self, matchLabels=matchLabels,
-                match_expressions=match_expressions)
-
-        self.matchLabels = matchLabels
-        self.match_expressions=[]
-
-class ExecAction(Dict):
-    def __init__(self, command=[]):
-        Dict.__init__(self, command=command)
-
-        self.command=command
-
-class Probe(Dict):
-    def __init__(self, exec=None, failureThreshold=3, initialDelaySeconds=10,
-            periodSeconds=10, successThreshold=1, timeoutSeconds=1):
-        Dict.__init__(self, exec=exec,
-                failureThreshold=failureThreshold,
-                initialDelaySeconds=initialDelaySeconds,
-                periodSeconds=periodSeconds,
-                successThreshold=successThreshold,
-                timeoutSeconds=timeoutSeconds)
-
-        self.exec=exec
-        self.failureThreshold=failureThreshold
-        self.initialDelaySeconds=initialDelaySeconds
-        self.periodSeconds=periodSeconds
-        self.successThreshold=successThreshold
-        self.timeoutSeconds=timeoutSeconds
-
-class Metadata(Dict):
-    def __init__(self, name='', cluster='', blockchain='', network='',
-            labels=None, annotations=None):
-        Dict.__init__(self, name=name, cluster=cluster, blockchain=blockchain,
-                network=network, labels=labels)
-        self.name        = name
-        self.cluster     = cluster
-        self.blockchain  = blockchain
-        self.network     = network
-        self.annotations = annotations
-        self.labels      = labels
-
-class PodSpec(Dict):
-    def __init__(self, containers=(), volumes=(), ports=(), selector=None,
-            backend=None):
-        Dict.__init__(self, selector=selector, containers=containers,
-                      volumes=volumes)
-        self.containers = containers
-        self.selector   = selector
-        self.volumes    = volumes
-        self.backend    = backend
-
-class Resources(Dict):
-    def __init__(self, requests=None, limits=None):
-        Dict.__init__(self, requests=requests, limits=limits)
-        self.requests = requests
-        self.limits   = limits
-
-class EnvVar(Dict):
-    def __init__(self, name=None, value=None, valueFrom=None):
-        Dict.__init__(self, name=name, value=value, valueFrom=valueFrom)
-        self.name = name
-        self.value = value
-        self.valueFrom = valueFrom
-
-class EnvVarSource(Dict):
-    def __init__(self, fieldRef=None):
-        Dict.__init__(self, fieldRef=fieldRef)
-        self.fieldRef = fieldRef
-
-class ObjectFieldSelector(Dict):
-    def __init__(self, fieldPath=None):
-        Dict.__init__(self, fieldPath=fieldPath)
-        self.fieldPath = fieldPath
-
-class Container(Dict):
-    def __init__(self, name, image, command, args, imagePullPolicy='Always', resources=None,
-                 volumeMounts=None, livenessProbe=None, readinessProbe=None,
-                 env=None):
-        Dict.__init__(self, name=name, image=image,command=command, args=args,
-                      imagePullPolicy=imagePullPolicy, resources=resources, livenessProbe=livenessProbe,
-                      readinessProbe=readinessProbe, env=env)
-        self.name            = name
-        self.image           = image
-        self.command         = command
-        self.args            = args
-        self.imagePullPolicy = imagePullPolicy
-        self.env             = env
-        self.resources       = resources
-        self.volumeMounts    = volumeMounts
-        self.livenessProbe   = livenessProbe
-        self.readinessProbe  = readinessProbe
-
-class Requests(Dict):
-    def __init__(self, cpu=None, memory=None):
-        Dict.__init__(self, cpu=cpu, memory=memory)
-        self.cpu    = cpu
-        self.memory = memory
-
-
-class Limits(Dict):
-    def __init__(self, cpu=None, memory=None):
-        Dict.__init__(self, cpu=cpu, memory=memory)
-        self.cpu    = cpu
-        self.memory = memory
-
-
-class VolumeMount(Dict):
-    def __init__(self, name, mountPath):
-        Dict.__init__(self, name=name, mountPath=mountPath)
-        self.name      = name
-        self.mountPath = mountPath
-
-
-class Volume(Dict):
-    def __init__(self, name, gcePersistentDisk=None, persistentVolumeClaim=None, emptyDir = None):
-        Dict.__init__(self,
-                    name=name,
-                    gcePersistentDisk=gcePersistentDisk,
-                    persistentVolumeClaim=persistentVolumeClaim,
-                    emptyDir=emptyDir)
-        self.name              = name
-        self.gcePersistentDisk = gcePersistentDisk
-        self.persistentVolumeClaim = persistentVolumeClaim
-        self.emptyDir          = emptyDir
-
-class PersistentVolumeClaimVolume(Dict):
-    def __init__(self, claimName):
-        Dict.__init__(self, claimName=claimName)
-        self.claimName = claimName
-
-class GcePersistentDisk(Dict):
-    def __init__(self, pdName, fsType):
-        Dict.__init__(self, pdName=pdName, fsType=fsType)
-        self.pdName = pdName
-        self.fsType = fsType
-
-class EmptyDir(Dict):
-    def __init__(self, medium='', sizeLimit='10Gi'):
-        Dict.__init__(self, medium=medium, sizeLimit=sizeLimit)
-        self.medium = medium
-        self.sizeLimit = sizeLimit
-
-class Backend(Dict):
-    def __init__(self, serviceName, servicePort):
-        Dict.__init__(self, serviceName=serviceName, servicePort=servicePort)
-        self.serviceName = serviceName
-        self.servicePort = servicePort
-
-
-class ServicePort(Dict):
-    def __init__(self, name=None, node_port=None, port=None, protocol='TCP',
-            targetPort=None, nodePort=None):
-        Dict.__init__(self, port=port, protocol=protocol,
-                targetPort=targetPort, nodePort=nodePort)
-        self.name       = name
-        self.nodePort   = nodePort
-        self.port       = port
-        self.protocol   = protocol
-        self.targetPort = targetPort
-
-
-class BaseTemplateSpec(Dict):
-    def __init__(self, apiVersion='v1', kind=None, metadata=Metadata(),
-                 spec=PodSpec()):
-        Dict.__init__(self, apiVersion=apiVersion, kind=kind,
-                      metadata=metadata, spec=spec)
-        self.apiVersion = apiVersion
-        self.kind       = kind
-        self.metadata   = metadata
-        self.spec       = spec
+# Blockchain constructors by every name they answer to, see register()
+BLOCKCHAINS = {}
+
+# Values every template repeats
+TCP            = 'TCP'
+LOAD_BALANCER  = 'LoadBalancer'
+NODE_PORT      = 'NodePort'
+ROLLING_UPDATE = 'RollingUpdate'
+ALWAYS         = 'Always'
+
+# Network ids by every name they answer to, and back, shared by all chains
+NETWORK_IDS = MappingProxyType({
+    'mainnet':  1,
+    'frontier': 1,
+    '1':        1,
+
+    'morden':   2,
+    '2':        2,
+
+    'testnet':  3,
+    'ropsten':  3,
+    '3':        3,
+
+    'rinkeby':  4,
+    '4':        4
+})
+
+NETWORKS = MappingProxyType({
+    1: 'mainnet',
+    2: 'morden',
+    3: 'testnet',
+    4: 'rinkeby'
+})
+
+# Bitcoin only has two networks, with ids of its own
+BITCOIN_NETWORK_IDS = MappingProxyType({
+    'mainnet':  1,
+    '1':        1,
+
+    'testnet':  2,
+    '2':        2,
+})
+
+BITCOIN_NETWORKS = MappingProxyType({
+    1: 'mainnet',
+    2: 'testnet',
+})
+
+# geth flags, formatted with the arguments given to Ethereum()
+ETHEREUM_ARGS = (
+    '--networkid={network_id}',
+    '--datadir=/data',
+    '--ethash.dagdir=/data/geth/chaindata/dag',
+    '--syncmode=fast',
+)
+
+ETHEREUM_RPC_ARGS = (
+    '--rpc',
+    '--rpcaddr=0.0.0.0',
+    '--rpcapi="eth,net,web3"',
+    '--rpcport={rpcport}',
+    '--rpccorsdomain="{rpccorsdomain}"',
+)
+
+ETHEREUM_WS_ARGS = (
+    '--ws',
+    '--wsaddr=0.0.0.0',
+    '--wsapi="eth,net,web3"',
+    '--wsport={wsport}',
+    '--wsorigins="{wsorigins}"',
+)
+
+
+@lru_cache(maxsize=64)
+def ethereum_args(network_id, size, rpc, ws, rpcport, rpccorsdomain, wsport,
+                  wsorigins):
+    """
+    geth flags for one combination of Ethereum() arguments, built once.
+    """
+    return tuple(arg.format(network_id=network_id, rpcport=rpcport,
+                            rpccorsdomain=rpccorsdomain, wsport=wsport,
+                            wsorigins=wsorigins)
+                 for arg in (*ETHEREUM_ARGS,
+                             *(ETHEREUM_RPC_ARGS if rpc else ()),
+                             *(ETHEREUM_WS_ARGS if ws else ()),
+                             *(ETHEREUM_SIZES[size][2] if size in ETHEREUM_SIZES else ())))
+
+
+def register(cls):
+    """
+    Class decorator which makes a Blockchain discoverable by its NAMES.
+    """
+    for name in cls.NAMES:
+        BLOCKCHAINS[name] = cls
+    return cls
+
+def to_dict(obj):
+    """
+    Serialize a template to the plain dicts and lists the kubernetes api
+    expects, leaving out fields which are unset.
+    """
+    if is_dataclass(obj):
+        names = (*getattr(obj, 'CLASS_FIELDS', ()), *(f.name for f in fields(obj)))
+        return {name: to_dict(v) for name in names
+                if (v := getattr(obj, name)) is not None}
+    if isinstance(obj, dict):
+        return {k: to_dict(v) for k, v in obj.items() if v is not None}
+    if isinstance(obj, (list, tuple)):
+        return [to_dict(v) for v in obj]
+    return obj
+
+
+class Template(object):
+    __slots__ = ()
+
+    # Serialized attributes which are set on the class rather than instances
+    CLASS_FIELDS = ()
+
+    def to_dict(self):
+        return to_dict(self)
+
+
+@dataclass(slots=True)
+class Selector(Template):
+    matchLabels:      dict = field(default_factory=dict)
+    matchExpressions: list = None
+
+@dataclass(slots=True, frozen=True)
+class ExecAction(Template):
+    command: tuple = ()
+
+@dataclass(slots=True, frozen=True)
+class Probe(Template):
+    exec:                ExecAction = None
+    failureThreshold:    int = 3
+    initialDelaySeconds: int = 10
+    periodSeconds:       int = 10
+    successThreshold:    int = 1
+    timeoutSeconds:      int = 1
+
+@dataclass(slots=True)
+class Metadata(Template):
+    name:        str  = ''
+    cluster:     str  = ''
+    blockchain:  str  = ''
+    network:     str  = ''
+    labels:      dict = None
+    annotations: dict = None
+
+@dataclass(slots=True)
+class PodSpec(Template):
+    containers: list = ()
+    volumes:    list = ()
+    selector:   dict = None
+    backend:    'Backend' = None
+
+@dataclass(slots=True)
+class Resources(Template):
+    requests: 'ResourceQuantity' = None
+    limits:   'ResourceQuantity' = None
+
+@dataclass(slots=True)
+class EnvVar(Template):
+    name:      str = None
+    value:     str = None
+    valueFrom: 'EnvVarSource' = None
+
+@dataclass(slots=True)
+class EnvVarSource(Template):
+    fieldRef: 'ObjectFieldSelector' = None
+
+@dataclass(slots=True)
+class ObjectFieldSelector(Template):
+    fieldPath: str = None
+
+@dataclass(slots=True)
+class Container(Template):
+    name:            str
+    image:           str
+    command:         list
+    args:            list
+    imagePullPolicy: str       = ALWAYS
+    resources:       Resources = None
+    volumeMounts:    list      = None
+    livenessProbe:   Probe     = None
+    readinessProbe:  Probe     = None
+    env:             list      = None
+
+@dataclass(slots=True, frozen=True)
+class ResourceQuantity(Template):
+    cpu:    str = None
+    memory: str = None
+
+# Requests and limits take the same cpu and memory quantities
+Requests = Limits = ResourceQuantity
+
+# Requests, limits and geth flags by node size, shared by every node of a size
+ETHEREUM_SIZES = MappingProxyType({
+    'small':  (Requests('2', '1Gi'), Limits('2', '1536Mi'), ('--cache=512',  '--maxpeers=15')),
+    'medium': (Requests('2', '2Gi'), Limits('2', '3Gi'),    ('--cache=1024', '--maxpeers=25')),
+    'large':  (Requests('2', '4Gi'), Limits('2', '6Gi'),    ('--cache=2048', '--maxpeers=50')),
+    'huge':   (Requests('2', '8Gi'), Limits('2', '12Gi'),   ('--cache=4096', '--maxpeers=100')),
+})
+
+# Requests and limits by Casper node size
+CASPER_SIZES = MappingProxyType({
+    'small':  (Requests('1', '2Gi'), Limits('1', '2Gi')),
+    'medium': (Requests('2', '2Gi'), Limits('2', '2Gi')),
+})
+
+
+@dataclass(slots=True)
+class VolumeMount(Template):
+    name:      str
+    mountPath: str
+
+
+@dataclass(slots=True)
+class Volume(Template):
+    name:                  str
+    gcePersistentDisk:     'GcePersistentDisk' = None
+    persistentVolumeClaim: 'PersistentVolumeClaimVolume' = None
+    emptyDir:              'EmptyDir' = None
+
+@dataclass(slots=True)
+class PersistentVolumeClaimVolume(Template):
+    claimName: str
+
+@dataclass(slots=True)
+class GcePersistentDisk(Template):
+    pdName: str
+    fsType: str
+
+@dataclass(slots=True)
+class EmptyDir(Template):
+    medium:    str = ''
+    sizeLimit: str = '10Gi'
+
+@dataclass(slots=True)
+class Backend(Template):
+    serviceName: str
+    servicePort: int
+
+
+@dataclass(slots=True, frozen=True)
+class ServicePort(Template):
+    name:       str = None
+    port:       int = None
+    protocol:   str = TCP
+    targetPort: int = None
+    nodePort:   int = None
+
+
+@dataclass(slots=True)
+class BaseTemplateSpec(Template):
+    CLASS_FIELDS = ('apiVersion', 'kind')
+
+    # Fixed per kind of resource, so kept on the class rather than instances
+    apiVersion: ClassVar[str] = 'v1'
+    kind:       ClassVar[str] = None
+
+    metadata: Metadata = field(default_factory=Metadata)
+    spec:     PodSpec  = field(default_factory=PodSpec)
 
 class Ingress(BaseTemplateSpec):
-    def __init__(self, metadata=None, spec=None):
-        super(Ingress, self).__init__(apiVersion='extensions/extensions/v1beta1beta1',
-                kind='Ingress', metadata=metadata, spec=spec)
+    __slots__  = ()
+    apiVersion = 'extensions/v1beta1'
+    kind       = 'Ingress'
 
 
 class PersistentVolumeClaim(BaseTemplateSpec):
-    def __init__(self, metadata=None, spec=None):
-        super(PersistentVolumeClaim, self).__init__(apiVersion='v1', kind='PersistentVolumeClaim', metadata=metadata, spec=spec)
+    __slots__  = ()
+    apiVersion = 'v1'
+    kind       = 'PersistentVolumeClaim'
 
-class PersistentVolumeClaimSpec(Dict):
-    def __init__(self, accessModes=['ReadWriteOnce'], resources=None,
-                 selector=None):
-        Dict.__init__(self, accessModes=accessModes,
-                resources=resources, selector=selector)
+@dataclass(slots=True)
+class PersistentVolumeClaimSpec(Template):
+    accessModes: list = field(default_factory=lambda: ['ReadWriteOnce'])
+    resources:   'ResourceRequirements' = None
+    selector:    Selector = None
 
-class ResourceRequirements(Dict):
-    def __init__(self, requests={'storage': '10Gi'},
-                 limits=None):
-        Dict.__init__(self, requests=requests,
-                limits=limits)
+@dataclass(slots=True)
+class ResourceRequirements(Template):
+    requests: dict = field(default_factory=lambda: {'storage': '10Gi'})
+    limits:   dict = None
 
 class Service(BaseTemplateSpec):
-    def __init__(self, metadata=None, spec=None):
-        super(Service, self).__init__(apiVersion='v1', kind='Service',
-                                  metadata=metadata, spec=spec)
-
-class ServiceSpec(Dict):
-    def __init__(self, clusterIp=None, externalIPs=None, externalName=None,
-            externalTrafficPolicy=None, healthCheckNodePort=None,
-            loadBalancerIp=None, loadBalancerSourceRanges=None, ports=None,
-            publishNotReadyAddresses=False, selector=Selector(),
-            sessionAffinity=None, sessionAffinityConfig=None, type='LoadBalancer'):
-        Dict.__init__(self, clusterIp=clusterIp,
-                externalIPs=externalIPs, externalName=externalName,
-                externalTrafficPolicy=externalTrafficPolicy,
-                healthCheckNodePort=healthCheckNodePort,
-                loadBalancerIp=loadBalancerIp,
-                loadBalancerSourceRanges=loadBalancerSourceRanges,
-                ports=ports, publishNotReadyAddresses=publishNotReadyAddresses,
-                selector=selector, sessionAffinity=sessionAffinity,
-                sessionAffinityConfig=sessionAffinityConfig, type=type)
-
-        self.externalIPs=externalIPs
-        self.externalName=externalName
-        self.externalTrafficPolicy=externalTrafficPolicy
-        self.healthCheckNodePort=healthCheckNodePort
-        self.loadBalancerIp=loadBalancerIp
-        self.loadBalancerSourceRanges=loadBalancerSourceRanges
-        self.ports=ports
-        self.publishNotReadyAddresses=publishNotReadyAddresses
-        self.selector=selector
-        self.sessionAffinity=sessionAffinity
-        self.sessionAffinityConfig=sessionAffinityConfig
-        self.type=type
+    __slots__  = ()
+    apiVersion = 'v1'
+    kind       = 'Service'
+
+@dataclass(slots=True)
+class ServiceSpec(Template):
+    clusterIp:                str  = None
+    externalIPs:              list = None
+    externalName:             str  = None
+    externalTrafficPolicy:    str  = None
+    healthCheckNodePort:      int  = None
+    loadBalancerIp:           str  = None
+    loadBalancerSourceRanges: list = None
+    ports:                    list = None
+    publishNotReadyAddresses: bool = False
+    selector:                 dict = field(default_factory=Selector)
+    sessionAffinity:          str  = None
+    sessionAffinityConfig:    dict = None
+    type:                     str  = LOAD_BALANCER
 
 class Pod(BaseTemplateSpec):
-    def __init__(self, metadata=None, spec=None):
-        super(Pod, self).__init__(apiVersion='v1', kind='Pod',
-                                  metadata=metadata, spec=spec)
-
-class DeploymentStrategy(Dict):
-    def __init__(self, type='RollingUpdate'):
-        Dict.__init__(self, type=type)
-
-        self.type = type
-
-class DeploymentSpec(Dict):
-    def __init__(self,
-                 minReadySeconds=0,
-                 paused=False,
-                 progressDeadlineSeconds=600,
-                 replicas=1,
-                 revisionHistoryLimit=10,
-                 selector={},
-                 strategy=DeploymentStrategy(),
-                 template=BaseTemplateSpec()):
-        Dict.__init__(self,
-                      minReadySeconds=minReadySeconds,
-                      paused=paused,
-                      progressDeadlineSeconds=progressDeadlineSeconds,
-                      replicas=replicas,
-                      revisionHistoryLimit=revisionHistoryLimit,
-                      selector=selector,
-                      strategy=strategy,
-                      template=template)
-
-        self.minReadySeconds            = minReadySeconds
-        self.paused                     = paused
-        self.progressDeadlineSeconds    = progressDeadlineSeconds
-        self.replicas                   = replicas
-        self.revisionHistoryLimit       = revisionHistoryLimit
-        self.selector                   = selector
-        self.strategy                   = strategy
-        self.template                   = template
+    __slots__  = ()
+    apiVersion = 'v1'
+    kind       = 'Pod'
+
+@dataclass(slots=True)
+class DeploymentStrategy(Template):
+    type: str = ROLLING_UPDATE
+
+@dataclass(slots=True)
+class DeploymentSpec(Template):
+    minReadySeconds:         int  = 0
+    paused:                  bool = False
+    progressDeadlineSeconds: int  = 600
+    replicas:                int  = 1
+    revisionHistoryLimit:    int  = 10
+    selector:                Selector = field(default_factory=dict)
+    strategy:                DeploymentStrategy = field(default_factory=DeploymentStrategy)
+    template:                BaseTemplateSpec = field(default_factory=BaseTemplateSpec)
 
 class Deployment(BaseTemplateSpec):
-    def __init__(self, metadata=None, spec=None):
-        super(Deployment, self).__init__(apiVersion='apps/v1', kind='Deployment',
-                                  metadata=metadata, spec=spec)
+    __slots__  = ()
+    apiVersion = 'apps/v1'
+    kind       = 'Deployment'
+
+# Readiness and liveness check every node container runs, frozen so sharing
+# it between containers is safe
+ALIVE_PROBE = Probe(exec=ExecAction(command=('./scripts/alive.sh',)))
 
 class Blockchain(Deployment):
+    __slots__ = ('name', 'cluster', 'blockchain', 'network', 'image', 'command',
+                 'args', 'path', 'deploymentMetadata', 'podMetadata', 'podSpec',
+                 'deploymentSpec', '_is_encloudify')
+
+    NAMES = ()
+
     def __init__(self, name, cluster, blockchain, network, image, command,
                  args, env, path,
                  requests=None, limits=None):
@@ -299,6 +364,9 @@ class Blockchain(Deployment):
         self.args       = args
         self.path       = path
 
+        # Private cloud clusters get node ports and empty dirs instead
+        self._is_encloudify = 'encloudify' in (cluster or '')
+
         self.deploymentMetadata = Metadata(
                 name=name,
                 cluster=cluster,
@@ -310,18 +378,20 @@ class Blockchain(Deployment):
                     'network': network,
                 })
 
+        # The deployment and its service both pick out pods by app alone
+        app_labels = {'app': name}
+
         self.podMetadata = Metadata(
                 name='pod-' + name,
                 cluster=cluster,
                 blockchain=blockchain,
                 network=network,
                 labels={
-                    'app': name
+                    'app': name,
+                    'network': network,
                 })
 
-        client = os.path.basename(command)
-
-        podSpec = self.podSpec = PodSpec(
+        self.podSpec = PodSpec(
             selector={},
             containers=[],
             volumes=[],
@@ -329,9 +399,7 @@ class Blockchain(Deployment):
 
         self.deploymentSpec = DeploymentSpec(
             selector=Selector(
-                matchLabels={
-                    'app': name
-                }
+                matchLabels=app_labels
             ),
             template=BaseTemplateSpec(
                 metadata=self.podMetadata,
@@ -339,34 +407,24 @@ class Blockchain(Deployment):
             )
         )
 
+        # The container mounts the volume by this name
+        pv_name = name + '-pv'
+
         container = Container(
             name=name,
             image=image,
             command=[command],
             args=args,
-            volumeMounts=[VolumeMount(mountPath=path, name=name + '-pv')],
-            resources=Resources(),
-            readinessProbe=Probe(
-                exec=ExecAction(
-                    command=['./scripts/alive.sh']
-                )
-            ),
-            livenessProbe=Probe(
-                exec=ExecAction(
-                    command=['./scripts/alive.sh']
-                )
-            ),
+            volumeMounts=[VolumeMount(mountPath=path, name=pv_name)],
+            resources=Resources(requests=requests, limits=limits),
+            readinessProbe=ALIVE_PROBE,
+            livenessProbe=ALIVE_PROBE,
         )
 
-        if requests:
-            container.resources.request = requests
-        if limits:
-            container.resources.limits = limits
-
         self.podSpec.containers.append(container)
 
         # user empty dir for private cloud stuff
-        if 'encloudify' in cluster:
+        if self._is_encloudify:
             container.env=[EnvVar(
                 name='EXTERNAL_IP',
                 valueFrom=EnvVarSource(
@@ -377,14 +435,14 @@ class Blockchain(Deployment):
             )]
 
             volume = Volume(
-                name=name + '-pv',
+                name=pv_name,
                 emptyDir=EmptyDir()
             )
 
             self.podSpec.volumes.append(volume)
         else:
             volume = Volume(
-                name=name + '-pv',
+                name=pv_name,
                 persistentVolumeClaim=PersistentVolumeClaimVolume(
                     claimName=name + '-pd'
                 )
@@ -392,14 +450,9 @@ class Blockchain(Deployment):
 
             self.podSpec.volumes.append(volume)
 
-        # Create a PodSpec
-        super(Blockchain, self).__init__(metadata=self.deploymentMetadata, spec=self.deploymentSpec)
-
-        self.name       = name
-        self.cluster    = cluster
-        self.blockchain = blockchain
-        self.network    = network
-        self.podSpec    = podSpec
+        # Only metadata and spec are serialized, the rest above is our own
+        Deployment.__init__(self, metadata=self.deploymentMetadata,
+                            spec=self.deploymentSpec)
 
     def set_env(self, name, value, container_id=0):
         if self.podSpec.containers[container_id].env is None:
@@ -410,41 +463,26 @@ class Blockchain(Deployment):
                                                                     value=value))
 
     def get_service(self, ports):
-        if 'encloudify' in self.cluster:
-            return Service(
-                metadata=Metadata(
-                    name='service-' + self.name,
-                    cluster=self.cluster,
-                    blockchain=self.blockchain,
-                    network=self.network
-                ),
-                spec=ServiceSpec(
-                    selector={
-                        'app': self.name
-                    },
-                    type='NodePort',
-                    ports=ports,
-                )
-            )
-        else:
-            return Service(
-                metadata=Metadata(
-                    name='service-' + self.name,
-                    cluster=self.cluster,
-                    blockchain=self.blockchain,
-                    network=self.network
-                ),
-                spec=ServiceSpec(
-                    selector={
-                        'app': self.name
-                    },
-                    type='LoadBalancer',
-                    ports=ports,
-                )
+        return Service(
+            metadata=Metadata(
+                name='service-' + self.name,
+                cluster=self.cluster,
+                blockchain=self.blockchain,
+                network=self.network,
+                labels={
+                    'blockchain': self.blockchain,
+                    'network': self.network,
+                }
+            ),
+            spec=ServiceSpec(
+                selector=self.deploymentSpec.selector.matchLabels,
+                type=NODE_PORT if self._is_encloudify else LOAD_BALANCER,
+                ports=ports,
             )
+        )
 
     def get_volume_claim(self, size='10Gi'):
-        if 'encloudify' in self.cluster:
+        if self._is_encloudify:
             return None
         else:
             return PersistentVolumeClaim(
@@ -463,27 +501,39 @@ class Blockchain(Deployment):
                 )
             )
 
-    @classmethod
-    def to_network_id(cls, network):
+    @staticmethod
+    def to_network_id(network):
         return 0
 
-    @classmethod
-    def to_network(cls, network_id):
+    @staticmethod
+    def to_network(network_id):
         return
 
-    @classmethod
-    def normalize_network(cls, network):
+    @staticmethod
+    def normalize_network(network):
         return None, 0
 
     @classmethod
     def is_blockchain(cls, chain):
-        return
+        return chain in cls.NAMES
 
-    @classmethod
-    def get_name(cls):
+    @staticmethod
+    def get_name():
         return "none"
 
+# rpc and ws ports of a geth node on its default ports, frozen so every
+# service can share them
+ETHEREUM_SERVICE_PORTS = (
+    ServicePort(name='rpc', protocol=TCP, port=8545, targetPort=8545),
+    ServicePort(name='ws',  protocol=TCP, port=8546, targetPort=8546),
+)
+
+@register
 class Ethereum(Blockchain):
+    __slots__ = ('rpcport', 'wsport', '_service')
+
+    NAMES = ('ethereum', 'eth', 'geth')
+
     def __init__(self, name, network='mainnet', cluster=None,
                  image='gcr.io/hanzo-ai/geth:latest', command='/bin/geth',
                  args=None, datadir='/data', path='./data/geth/chaindata',
@@ -498,101 +548,56 @@ class Ethereum(Blockchain):
         network, network_id = Ethereum.normalize_network(network)
 
         if args is None:
-            args = [
-                '--networkid={0}'.format(network_id),
-                '--datadir=/data',
-                '--ethash.dagdir=/data/geth/chaindata/dag',
-                '--syncmode=fast',
-            ]
-
-            if rpc:
-                args.extend([
-                    '--rpc',
-                    '--rpcaddr=0.0.0.0',
-                    '--rpcapi="eth,net,web3"',
-                    '--rpcport={0}'.format(rpcport),
-                    '--rpccorsdomain="{0}"'.format(rpccorsdomain),
-                ])
-
-            if ws:
-                args.extend([
-                    '--ws',
-                    '--wsaddr=0.0.0.0',
-                    '--wsapi="eth,net,web3"',
-                    '--wsport={0}'.format(wsport),
-                    '--wsorigins="{0}"'.format(wsorigins),
-                ])
-
             if size is None and requests is None:
-                if network is 'mainnet':
+                if network == 'mainnet':
                     size = 'large'
-                elif network is 'testnet':
+                elif network == 'testnet':
                     size = 'medium'
                 else:
                     size = 'small'
 
-            if size == 'small':
-                requests = Requests(cpu='2', memory='1Gi')
-                limits   = Limits(cpu='2',   memory='1536Mi')
-                args.extend([
-                    '--cache=512',
-                    '--maxpeers=15',
-                ])
-
-            elif size == 'medium':
-                requests = Requests(cpu='2', memory='2Gi')
-                limits   = Limits(cpu='2',   memory='3Gi')
-                args.extend([
-                    '--cache=1024',
-                    '--maxpeers=25',
-                ])
-
-            elif size == 'large':
-                requests = Requests(cpu='2', memory='4Gi')
-                limits   = Limits(cpu='2',   memory='6Gi')
-                args.extend([
-                    '--cache=2048',
-                    '--maxpeers=50',
-                ])
-
-            elif size == 'huge':
-                requests = Requests(cpu='2', memory='8Gi')
-                limits   = Limits(cpu='2',   memory='12Gi')
-                args.extend([
-                    '--cache=4096',
-                    '--maxpeers=100',
-                ])
+            profile = ETHEREUM_SIZES.get(size)
+            if profile is not None:
+                requests, limits = profile[:2]
+
+            args = list(ethereum_args(network_id, size, rpc, ws, rpcport,
+                                      rpccorsdomain, wsport, wsorigins))
 
         # Generate a PodSpec
         super(Ethereum, self).__init__(name, cluster, 'ethereum', network, image,
                                        command, args, None, path, requests, limits)
 
-        this.rpcport=rpcport
-        this.wsport=wsport
-
+        self.rpcport  = rpcport
+        self.wsport   = wsport
+        self._service = None
 
     def get_service(self):
+        # Built on first use and kept, the ports never change after __init__
+        if self._service is None:
+            self._service = self.build_service()
+        return self._service
+
+    def build_service(self):
+        if (self.rpcport, self.wsport) == (8545, 8546):
+            return super(Ethereum, self).get_service(list(ETHEREUM_SERVICE_PORTS))
+
         ports = []
         ports.append(
             ServicePort(
                 name='rpc',
-                protocol='TCP',
+                protocol=TCP,
                 port=self.rpcport,
                 targetPort=8545
             ))
         ports.append(
             ServicePort(
                 name='ws',
-                protocol='TCP',
+                protocol=TCP,
                 port=self.wsport,
                 targetPort=8546
             ))
 
-        print(ports)
-        service = super(Ethereum, self).get_service(ports)
-        print(service)
-
-        return service
+        return super(Ethereum, self).get_service(ports)
 
     def get_volume_claim(self, size='100Gi'):
         return PersistentVolumeClaim(
@@ -611,48 +616,31 @@ class Ethereum(Blockchain):
             )
         )
 
-    @classmethod
-    def to_network_id(cls, network):
-        return {
-            'mainnet':  1,
-            'frontier': 1,
-            '1':        1,
-
-            'morden':   2,
-            '2':        2,
+    @staticmethod
+    def to_network_id(network):
+        return NETWORK_IDS.get(str(network).lower())
 
-            'testnet':  3,
-            'ropsten':  3,
-            '3':        3,
-
-            'rinkeby':  4,
-            '4':        4
-        }.get(str(network).lower())
-
-    @classmethod
-    def to_network(cls, network_id):
-        return {
-            1: 'mainnet',
-            2: 'morden',
-            3: 'testnet',
-            4: 'rinkeby'
-        }.get(network_id)
+    @staticmethod
+    def to_network(network_id):
+        return NETWORKS.get(network_id)
 
-    @classmethod
-    def normalize_network(cls, network):
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def normalize_network(network):
         network_id = Ethereum.to_network_id(network)
         network    = Ethereum.to_network(network_id)
         return network, network_id
 
-    @classmethod
-    def is_blockchain(cls, chain):
-        return chain in ['ethereum', 'eth', 'geth']
-
-    @classmethod
-    def get_name(cls):
+    @staticmethod
+    def get_name():
         return 'geth'
 
+@register
 class Casper(Blockchain):
+    __slots__ = ('grpc_port_external', 'server_port', 'discovery_port')
+
+    NAMES = ('casper', 'cbc')
+
     def __init__(self, name, network='mainnet', cluster=None, path='/.casperlabs',
                  image='gcr.io/hanzo-ai/casper:latest',
                  command='/scripts/start.sh',
@@ -668,34 +656,21 @@ class Casper(Blockchain):
         network, network_id = Casper.normalize_network(network)
 
         if args is None:
-            args = []
-                # '--grpc-port {0}'.format(grpcport),
-                # '--server-port {0}'.format(serverport),
-                # '--server-no-upnp',
-            # ]
-
+            # f'--grpc-port {grpcport}',
+            # f'--server-port {serverport}',
+            # '--server-no-upnp',
             if bootstrapaddress is None:
-                args.extend(['--casper-standalone'])
+                args = ['--casper-standalone']
             else:
-                args.extend([
-                    '--server-bootstrap {0}'.format(bootstrapaddress),
-                ])
+                args = [f'--server-bootstrap {bootstrapaddress}']
 
         if size is None and requests is None:
-            if network is 'mainnet':
-                size = 'medium'
-            elif network is 'testnet':
-                size = 'small'
-            else:
-                size = 'small'
+            size = 'medium' if network == 'mainnet' else 'small'
 
-        if size == 'small':
-            requests = Requests(cpu='1', memory='2Gi')
-            limits   = Limits(cpu='1',   memory='2Gi')
-
-        elif size == 'medium':
-            requests = Requests(cpu='2', memory='2Gi')
-            limits   = Limits(cpu='2',   memory='2Gi')
+        limits  = None
+        profile = CASPER_SIZES.get(size)
+        if profile is not None:
+            requests, limits = profile
 
         # Generate a PodSpec
         super(Casper, self).__init__(name, cluster, 'casper', network, image,
@@ -703,7 +678,7 @@ class Casper(Blockchain):
 
         grpc_port = 40401
         # user empty dir for private cloud stuff
-        if 'encloudify' in cluster:
+        if self._is_encloudify:
             # self.grpc_port_external = secrets.randbelow(2767) + 30000
             # self.server_port = secrets.randbelow(2767) + 30000
             # self.discovery_port = secrets.randbelow(2767) + 30000
@@ -716,9 +691,9 @@ class Casper(Blockchain):
 
             self.podSpec.containers[0].env.append(EnvVar(
                 name='PORTS',
-                value='--grpc-port-external {0} --server-port {1} --server-kademlia-port {2}'.format(self.grpc_port_external,
-                                                   self.server_port,
-                                                   self.discovery_port)
+                value=f'--grpc-port-external {self.grpc_port_external} '
+                      f'--server-port {self.server_port} '
+                      f'--server-kademlia-port {self.discovery_port}'
             ))
 
         envoyContainer = Container(
@@ -726,7 +701,7 @@ class Casper(Blockchain):
             image='gcr.io/hanzo-ai/casper-envoy:latest',
             command=['/scripts/start.sh'],
             args=['--config-path envoyConfig.yaml'],
-            env=[EnvVar(name='GRPC_PORT', value='{0}'.format(grpc_port))],
+            env=[EnvVar(name='GRPC_PORT', value=f'{grpc_port}')],
             resources=Resources(limits=Limits(cpu='0.1', memory='0.1Gi')),
         )
 
@@ -734,25 +709,25 @@ class Casper(Blockchain):
 
     def get_service(self):
         ports = []
-        if 'encloudify' in self.cluster:
+        if self._is_encloudify:
             ports.append(
                 ServicePort(
                     name='grpc',
-                    protocol='TCP',
+                    protocol=TCP,
                     port=self.grpc_port_external,
                     nodePort=self.grpc_port_external,
                 ))
             ports.append(
                 ServicePort(
                     name='server',
-                    protocol='TCP',
+                    protocol=TCP,
                     port=self.server_port,
                     nodePort=self.server_port,
                 ))
             ports.append(
                 ServicePort(
                     name='discovery',
-                    protocol='TCP',
+                    protocol=TCP,
                     port=self.discovery_port,
                     nodePort=self.discovery_port,
                 ))
@@ -760,28 +735,28 @@ class Casper(Blockchain):
             ports.append(
                 ServicePort(
                     name='grpc',
-                    protocol='TCP',
+                    protocol=TCP,
                     port=40401,
                     targetPort=40401
                 ))
             ports.append(
                 ServicePort(
                     name='server',
-                    protocol='TCP',
+                    protocol=TCP,
                     port=40400,
                     targetPort=40400
                 ))
             ports.append(
                 ServicePort(
                     name='discovery',
-                    protocol='TCP',
+                    protocol=TCP,
                     port=40404,
                     targetPort=40404
                 ))
         ports.append(
             ServicePort(
                 name='rpc',
-                protocol='TCP',
+                protocol=TCP,
                 port=9001,
                 targetPort=9001
             ))
@@ -797,89 +772,61 @@ class Casper(Blockchain):
 
         return service
 
-    @classmethod
-    def to_network_id(cls, network):
-        return {
-            'mainnet':  1,
-            'frontier': 1,
-            '1':        1,
-
-            'morden':   2,
-            '2':        2,
+    @staticmethod
+    def to_network_id(network):
+        return NETWORK_IDS.get(str(network).lower())
 
-            'testnet':  3,
-            'ropsten':  3,
-            '3':        3,
+    @staticmethod
+    def to_network(network_id):
+        return NETWORKS.get(network_id)
 
-            'rinkeby':  4,
-            '4':        4
-        }.get(str(network).lower())
-
-    @classmethod
-    def to_network(cls, network_id):
-        return {
-            1: 'mainnet',
-            2: 'morden',
-            3: 'testnet',
-            4: 'rinkeby'
-        }.get(network_id)
-
-    @classmethod
-    def normalize_network(cls, network):
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def normalize_network(network):
         network_id = Casper.to_network_id(network)
         network    = Casper.to_network(network_id)
         return network, network_id
 
-    @classmethod
-    def is_blockchain(cls, chain):
-        return chain in ['casper', 'cbc']
-
-    @classmethod
-    def get_name(cls):
+    @staticmethod
+    def get_name():
         return 'casper'
 
 class Bitcoin(Blockchain):
+    __slots__ = ()
+
+    NAMES = ('bitcoin',)
+
     def __init__(self, name, network, image, command, args, path,
-                 resources=None, limits=None):
+                 resources=None, limits=None, cluster=None):
         """
         Takes Bitcoin parameters and generates a DeploymentSpec json
         """
 
         #Generate PodSpec
-        super(Bitcoin, self).__init__(name, 'bitcoin', network, image, command,
-                                      args, path, resources, limits)
-
-    @classmethod
-    def to_network_id(cls, network):
-        return {
-            'mainnet':  1,
-            'frontier': 1,
-            '1':        1,
-
-            'morden':   2,
-            '2':        2,
-
-            'testnet':  3,
-            'ropsten':  3,
-            '3':        3,
-
-            'rinkeby':  4,
-            '4':        4
-        }.get(str(network).lower())
-
-    @classmethod
-    def to_network(cls, network_id):
-        return {
-            1: 'mainnet',
-            2: 'testnet',
-        }.get(network_id)
-
-    @classmethod
-    def normalize_network(cls, network):
-        network_id = Ethereum.to_network_id(network)
-        network    = Ethereum.to_network(network_id)
+        super(Bitcoin, self).__init__(name=name, cluster=cluster,
+                                      blockchain='bitcoin', network=network,
+                                      image=image, command=command, args=args,
+                                      env=None, path=path, requests=resources,
+                                      limits=limits)
+
+    @staticmethod
+    def to_network_id(network):
+        return BITCOIN_NETWORK_IDS.get(str(network).lower())
+
+    @staticmethod
+    def to_network(network_id):
+        return BITCOIN_NETWORKS.get(network_id)
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def normalize_network(network):
+        """
+        >>> Bitcoin.normalize_network('mainnet')
+        ('mainnet', 1)
+        >>> Bitcoin.normalize_network('testnet')
+        ('testnet', 2)
+        """
+        network_id = Bitcoin.to_network_id(network)
+        network    = Bitcoin.to_network(network_id)
         return network, network_id
 
-    @classmethod
-    def is_blockchain(cls, chain):
-        return chain in ['bitcoin']
@@ -1,151 +1,170 @@
 #!/usr/bin/env python3
 import sys
 import argparse
-from bootnode import Bootnode, complete
+import functools
+import asyncio
+import inspect
 
 
-def run_command(cmd, args):
-    # Get argument names
-    keys = [k for k in dir(args) if not k.startswith('_') and not k == 'command']
-
-    # Create kwargs from args specified
-    kwargs = dict(map(lambda k: (k, getattr(args, k)), keys))
-
-    # Clear out any default args that are unspecified
-    kwargs = {k: v for k, v in kwargs.items() if v is not None}
-
-    bootnode = Bootnode(args.chain, args.network, args.zone)
-
-    del kwargs['chain']
-    del kwargs['network']
-    del kwargs['zone']
-
-    # Call relevant method on Bootnode
-    getattr(bootnode, cmd)(**kwargs)
-
+# Options picking the cluster, as (option, help) pairs
+OPTIONS = (
+    ('--chain',    'Blockchain'),
+    ('--network',  'Blockchain network'),
+    ('--zone',     'Cluster zone'),
+    ('--provider', 'Cloud provider, i.e. private-cloud'),
+)
 
-def parser():
-    parser = argparse.ArgumentParser(description='Cluster management commands')
-    parser.add_argument('--chain', help='Blockchain')
-    parser.add_argument('--network', help='Blockchain network')
-    parser.add_argument('--zone', help='Cluster zone')
-    subparsers = parser.add_subparsers()
+# Where _dump-completions leaves the completion data for the shell
+COMPLETIONS_PATH = '~/.cache/bootnode/completions.json'
 
+# Subcommands as (name, Bootnode method, help, (argument, help) pairs)
+SUBCOMMANDS = (
     # Disks
-    create_disk = subparsers.add_parser('create-disk', help='Create disk')
-    create_disk.add_argument('snapshot', help='Name of snapshot to use as source')
-    create_disk.add_argument('name', help='Name of disk')
-    create_disk.set_defaults(command='create_disk')
+    ('create-disk', 'create_disk', 'Create disk', (('snapshot', 'Name of snapshot to use as source'), ('name', 'Name of disk'))),
+    ('disk', 'get_disk', 'Get disk', (('name', 'Name of disk'),)),
+    ('disks', 'list_disks', 'List disks', ()),
+    ('last-disk', 'get_last_disk', 'Get last disk', ()),
 
-    get_disk = subparsers.add_parser('disk', help='Get disk')
-    get_disk.add_argument('name', help='Name of disk')
-    get_disk.set_defaults(command='get_disk')
-
-    list_disks = subparsers.add_parser('disks', help='List disks')
-    list_disks.set_defaults(command='list_disks')
+    # Snapshots
+    ('snapshot', 'get_snapshot', 'Get snapshot', (('name', 'Name of snapshot'),)),
+    ('snapshots', 'list_snapshots', 'List snapshots', ()),
+    ('last-snapshot', 'get_last_snapshot', 'Get last snapshot', ()),
+    ('snapshot-pod', 'snapshot_pod', 'Snapshot pod', (('name', 'Pod to snapshot'),)),
+    ('snapshot-disk', 'snapshot_disk', 'Snapshot disk', (('name', 'Disk to snapshot'),)),
+    ('update-snapshot', 'update_snapshot', 'Update snapshot for a given network', (('network', 'Network to snapshot'),)),
 
-    get_last_disk = subparsers.add_parser('last-disk', help='Get last disk')
-    get_last_disk.set_defaults(command='get_last_disk')
+    # Pods
+    ('create-pod', 'create_pod', 'Create pod', ()),
+    ('delete-pod', 'delete_pod', 'Delete pod', (('name', 'Name of pod'),)),
+    ('pods', 'list_pods', 'List pods', ()),
+    ('pod', 'get_pod', 'Get pod', (('name', 'Name of pod'),)),
+    ('last-pod', 'get_last_pod', 'Last pod', ()),
+    ('synced-pod', 'get_synced_pod', 'Get any synced pod', ()),
+    ('block-number', 'get_block_number', 'Get block number for pod', (('name', 'Name of pod'),)),
 
-    # Snapshots
-    get_snapshot = subparsers.add_parser('snapshot', help='Get snapshot')
-    get_snapshot.add_argument('name', help='Name of snapshot')
-    get_snapshot.set_defaults(command='get_snapshot')
+    # Deployments
+    ('create-deployment', 'create_deployment', 'Create deployment', ()),
+    ('delete-deployment', 'delete_deployment', 'Delete deployment', (('name', 'Name of deployment'),)),
+    ('deployments', 'list_deployments', 'List deployments', ()),
+    ('deployment', 'get_deployment', 'Get deployment', (('name', 'Name of deployment'),)),
+    ('last-deployment', 'get_last_deployment', 'Last deployment', ()),
 
-    list_snapshots = subparsers.add_parser('snapshots', help='List snapshots')
-    list_snapshots.set_defaults(command='list_snapshots')
+    # Clusters
+    ('create-cluster', 'create_cluster', 'Create a new cluster', ()),
+    ('delete-cluster', 'delete_cluster', 'Delete a cluster', ()),
+    ('clusters', 'list_clusters', 'List clusters', ()),
+    ('cluster', 'get_cluster', 'Get cluster', ()),
 
-    get_last_snapshot = subparsers.add_parser('last-snapshot', help='Get last snapshot')
-    get_last_snapshot.set_defaults(command='get_last_snapshot')
+    # Load balancers
+    ('create-load-balancer', 'create_load_balancer', 'Create a new load_balancer', ()),
 
-    snapshot_pod = subparsers.add_parser('snapshot-pod', help='Snapshot pod')
-    snapshot_pod.add_argument('name', help='Pod to snapshot')
-    snapshot_pod.set_defaults(command='snapshot_pod')
+    # Scaling
+    ('scale-up', 'scale_up', 'Scale up blockchain nodes', (('network', 'Network to scale'),)),
+    ('scale-down', 'scale_down', 'Scale down blockchain nodes', (('network', 'Network to scale'),)),
+)
 
-    snapshot_disk = subparsers.add_parser('snapshot-disk', help='Snapshot disk')
-    snapshot_disk.add_argument('name', help='Disk to snapshot')
-    snapshot_disk.set_defaults(command='snapshot_disk')
+SUBCOMMAND_NAMES = frozenset(name for name, *_ in SUBCOMMANDS)
 
-    update_snapshot = subparsers.add_parser('update-snapshot', help='Update snapshot for a given network')
-    update_snapshot.add_argument('network', help='Network to snapshot')
-    update_snapshot.set_defaults(command='update_snapshot')
+# Parsed options which aren't passed on to the Bootnode method
+CLUSTER_OPTIONS = frozenset(('command', 'chain', 'network', 'provider', 'zone'))
 
-    # Pods
-    create_pod = subparsers.add_parser('create-pod', help='Create pod')
-    create_pod.set_defaults(command='create_pod')
 
-    delete_pod = subparsers.add_parser('delete-pod', help='Delete pod')
-    delete_pod.add_argument('name', help='Name of pod')
-    delete_pod.set_defaults(command='delete_pod')
+def run_command(cmd, args):
+    # Imported here so --help and bad commands don't load the cloud clients
+    from bootnode import Bootnode
 
-    list_pods = subparsers.add_parser('pods', help='List pods')
-    list_pods.set_defaults(command='list_pods')
+    # Create kwargs from subcommand args specified, leaving out unspecified
+    # defaults and the options which pick the cluster
+    kwargs = {k: v for k, v in vars(args).items()
+              if v is not None and k not in CLUSTER_OPTIONS}
 
-    get_pod = subparsers.add_parser('pod', help='Get pod')
-    get_pod.add_argument('name', help='Name of pod')
-    get_pod.set_defaults(command='get_pod')
+    bootnode = Bootnode(args.chain, args.network, args.provider, args.zone)
 
-    get_last_pod = subparsers.add_parser('last-pod', help='Last pod')
-    get_last_pod.set_defaults(command='get_last_pod')
+    # Call relevant method on Bootnode, running it through if it's async
+    result = getattr(bootnode, cmd)(**kwargs)
+    if inspect.isawaitable(result):
+        asyncio.run(run_async(bootnode, result))
 
-    last_parser = subparsers.add_parser('synced-pod', help='Get any synced pod')
-    last_parser.set_defaults(command='get_synced_pod')
 
-    get_block_number = subparsers.add_parser('block-number', help='Get block number for pod')
-    get_block_number.add_argument('name', help='Name of pod')
-    get_block_number.set_defaults(command='get_block_number')
+async def run_async(bootnode, coro):
+    try:
+        return await coro
+    finally:
+        # Clients are tied to this event loop, close them before it goes
+        await bootnode.close()
 
-    # Deployments
-    create_deployment = subparsers.add_parser('create-deployment', help='Create deployment')
-    create_deployment.set_defaults(command='create_deployment')
 
-    delete_deployment = subparsers.add_parser('delete-deployment', help='Delete deployment')
-    delete_deployment.add_argument('name', help='Name of deployment')
-    delete_deployment.set_defaults(command='delete_deployment')
+@functools.lru_cache(maxsize=4)
+def build_parser(names=None):
+    """
+    Parser for the subcommands in names, or every subcommand if None.
+    """
+    parser = argparse.ArgumentParser(description='Cluster management commands')
+    for option, option_help in OPTIONS:
+        parser.add_argument(option, help=option_help)
+    subparsers = parser.add_subparsers()
 
-    list_deployments = subparsers.add_parser('deployments', help='List deployments')
-    list_deployments.set_defaults(command='list_deployments')
+    for name, command, help, arguments in SUBCOMMANDS:
+        if names is not None and name not in names:
+            continue
+        subparser = subparsers.add_parser(name, help=help)
+        for argument, argument_help in arguments:
+            subparser.add_argument(argument, help=argument_help)
+        subparser.set_defaults(command=command)
 
-    get_deployment = subparsers.add_parser('deployment', help='Get deployment')
-    get_deployment.add_argument('name', help='Name of deployment')
-    get_deployment.set_defaults(command='get_deployment')
+    return parser
 
-    get_last_deployment = subparsers.add_parser('last-deployment', help='Last deployment')
-    get_last_deployment.set_defaults(command='get_last_deployment')
 
-    # Clusters
-    create_cluster = subparsers.add_parser('create-cluster', help='Create a new cluster')
-    create_cluster.set_defaults(command='create_cluster')
+def requested_subcommands(argv):
+    """
+    Subcommand names on the command line, or None to build all of them for
+    --help and usage errors.
+    """
+    names = frozenset(argv) & SUBCOMMAND_NAMES
+    return names or None
 
-    delete_cluster = subparsers.add_parser('delete-cluster', help='Delete a cluster')
-    delete_cluster.set_defaults(command='delete_cluster')
 
-    list_clusters = subparsers.add_parser('clusters', help='List clusters')
-    list_clusters.set_defaults(command='list_clusters')
+def complete():
+    """
+    Print command:description completions straight from SUBCOMMANDS,
+    without building a parser.
+    """
+    print('\n'.join('{0}:{1}'.format(name, help)
+                    for name, _, help, _ in SUBCOMMANDS))
+    sys.exit(0)
 
-    get_cluster = subparsers.add_parser('cluster', help='Get cluster')
-    get_cluster.set_defaults(command='get_cluster')
 
-    # Load balancers
-    create_load_balancer = subparsers.add_parser('create-load-balancer', help='Create a new load_balancer')
-    create_load_balancer.set_defaults(command='create_load_balancer')
+def dump_completions(path=COMPLETIONS_PATH):
+    """
+    Write options and subcommands with their arguments as JSON, once, so a
+    shell completer can read them without starting Python on every Tab.
+    """
+    import json
+    import os
 
-    # Scale up
-    scale_up = subparsers.add_parser('scale-up', help='Scale up blockchain nodes')
-    scale_up.add_argument('network', help='Network to scale')
-    scale_up.set_defaults(command='scale_up')
+    completions = {
+        'options': [option for option, _ in OPTIONS],
+        'commands': {name: {'help': help,
+                            'arguments': [argument for argument, _ in arguments]}
+                     for name, _, help, arguments in SUBCOMMANDS},
+    }
 
-    # Scale down
-    scale_down = subparsers.add_parser('scale-down', help='Scale down blockchain nodes')
-    scale_down.add_argument('network', help='Network to scale')
-    scale_down.set_defaults(command='scale_down')
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(completions, f)
 
-    return parser
+    print(path)
+    sys.exit(0)
 
 
 if __name__ == '__main__':
-    parser = parser()
-    complete(sys.argv, parser)
+    if sys.argv[1:2] == ['complete']:
+        complete()
+    if sys.argv[1:2] == ['_dump-completions']:
+        dump_completions()
+
+    parser = build_parser(requested_subcommands(sys.argv[1:]))
     args = parser.parse_args()
 
     try:
@@ -1,48 +1,58 @@
+DEPLOYMENT_KEYS = ('name', 'blockchain', 'network')
+SERVICE_KEYS    = ('name', 'ip', 'ports')
+POD_KEYS        = ('name', 'status', 'blockchain', 'network', 'number')
+
+def valid(items, keys, kind):
+    """
+    Items which have every key to_nodes reads, warning about the rest.
+    """
+    checked = []
+    for item in items:
+        missing = [k for k in keys if k not in item]
+        if missing:
+            print(f'warning: skipping invalid {kind} {item}: missing {missing}')
+        else:
+            checked.append(item)
+    return checked
+
 def to_nodes(deployments, services, pods, zone):
-    nodes_by_id = {}
-    nodes = []
-    for d in deployments:
-        try:
-            nodes_by_id[d['name']] = len(nodes)
-
-            nodes.append({
-                'blockchain': d['blockchain'],
-                'network': d['network'],
-                'id': d['name'],
-                'instances': [],
-                'zone': zone,
-            })
-        except Exception as e:
-            print('warning: skipping invalid deployment ' + str(d) + ': ' + str(e))
+    deployments = valid(deployments, DEPLOYMENT_KEYS, 'deployment')
+    services    = valid(services, SERVICE_KEYS, 'service')
+    pods        = valid(pods, POD_KEYS, 'pod')
+
+    nodes = [{
+        'blockchain': d['blockchain'],
+        'network': d['network'],
+        'id': d['name'],
+        'instances': [],
+        'zone': zone,
+    } for d in deployments]
+    nodes_by_id = {d['name']: i for i, d in enumerate(deployments)}
 
     for s in services:
-        try:
-            i = nodes_by_id.get(s['name'])
+        i = nodes_by_id.get(s['name'])
 
-            if i is not None:
-                nodes[i]['ip'] = s['ip']
-                nodes[i]['ports'] = s['ports']
-            else:
-                print('{0} does not exist'.format(s['name']))
-        except Exception as e:
-            print('warning: skipping invalid service ' + str(s) + ': ' + str(e))
+        if i is not None:
+            node = nodes[i]
+            node['ip'] = s['ip']
+            node['ports'] = s['ports']
+        else:
+            print(f"{s['name']} does not exist")
 
     for p in pods:
-        try:
-            i = nodes_by_id.get('{0}-{1}-{2}'.format(p['blockchain'], p['network'], p['number']))
-
-            if i is not None:
-                nodes[i]['instances'].append({
-                    'name': p['name'],
-                    'status': p['status'],
-                })
-
-                if nodes[i]['ip'] == '':
-                    nodes[i]['ip'] = p['ip']
-            else:
-                print('{0} does not exist'.format(p['name']))
-        except Exception as e:
-            print('warning: skipping invalid pod ' + str(p) + ': ' + str(e))
+        i = nodes_by_id.get(f"{p['blockchain']}-{p['network']}-{p['number']}")
 
-    return nodes
+        if i is not None:
+            node = nodes[i]
+            node['instances'].append({
+                'name': p['name'],
+                'status': p['status'],
+            })
+
+            # Nodes without a service yet have no ip to fill in
+            if node.get('ip') == '':
+                node['ip'] = p.get('ip', '')
+        else:
+            print(f"{p['name']} does not exist")
 
+    return nodes
@@ -1,13 +1,12 @@
-import json
-import datetime
+import orjson
 from quart import Response
 
 def default(o):
-    if isinstance(o, (datetime.date, datetime.datetime)):
-        return o.isoformat()
+    # orjson already encodes dates, datetimes and the other builtin types,
+    # anything else it can't encode goes out as null
+    return None
 
 def jsonify(obj):
-    return Response(json.dumps(obj, indent = 2, separators = (', ', ': '), default=default),
+    return Response(orjson.dumps(obj, default=default,
+                                 option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS),
         content_type='application/json')
-
-